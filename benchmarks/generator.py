@@ -0,0 +1,38 @@
+import random
+from typing import Iterator, Tuple
+from core.models import Customer, CorporateCustomer, PremiumCustomer, RegularCustomer
+
+FIRST_NAMES = ['Alice', 'Bob', 'Carlos', 'Daniela', 'Elena', 'Felipe', 'Gabriela', 'Hugo',
+               'Isabel', 'Javier', 'Karla', 'Luis', 'Marta', 'Nicolas', 'Olivia', 'Pablo']
+LAST_NAMES = ['Smith', 'Jones', 'Ruiz', 'Garcia', 'Rojas', 'Munoz', 'Silva', 'Torres',
+              'Lopez', 'Diaz', 'Soto', 'Perez', 'Morales', 'Castro', 'Vargas', 'Reyes']
+COMPANIES = ['Tech Corp', 'SolutionTech', 'Andes Mining', 'Pacific Foods', 'Blue Logistics',
+             'Nova Retail', 'Quantum Labs', 'Southern Energy']
+POSITIONS = ['CEO', 'CTO', 'CFO', 'Manager', 'Analyst', 'Buyer']
+
+
+def generate_customers(count: int, seed: int = 42, mix: Tuple[float, float, float] = (0.6, 0.3, 0.1),
+                       start: int = 0) -> Iterator[Customer]:
+    """
+    Yields `count` valid customers. The same seed always produces the same customers.
+    `mix` is the share of Regular, Premium and Corporate customers; `start` offsets the
+    sequence numbers, so new customers can be generated without clashing with existing IDs.
+    """
+    rng = random.Random(seed + start)
+    regular_share, premium_share, _ = mix
+    for i in range(start, start + count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        name = f"{first} {last}"
+        email = f"{first.lower()}.{last.lower()}{i}@example.com"
+        # Sequence-based numbers are unique and match DataValidator.PHONE_REGEX
+        phone = f"+569{i % 100000000:08d}"
+
+        roll = rng.random()
+        if roll < regular_share:
+            yield RegularCustomer(f"R{i:08d}", name, email, phone)
+        elif roll < regular_share + premium_share:
+            yield PremiumCustomer(f"P{i:08d}", name, email, phone, rng.randint(0, 5000))
+        else:
+            yield CorporateCustomer(f"C{i:08d}", name, email, phone, rng.choice(COMPANIES),
+                                    f"{rng.randint(10000000, 99999999)}-{rng.randint(0, 9)}",
+                                    rng.choice(POSITIONS), rng.randint(0, 30))
@@ -0,0 +1,194 @@
+"""
+Benchmark harness for the storage backends.
+
+Usage:
+    python -m benchmarks.run_benchmarks --scales 1000 100000 --output bench.json
+
+Every (backend, scale) pair runs on a fresh temporary store filled with the deterministic
+customers of benchmarks.generator. Results are printed (or written) as JSON.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.generator import generate_customers
+from data.repository import CustomerRepository, JSONLinesRepository, JSONRepository, SQLiteRepository
+from data.sharded_repository import ShardedSQLiteRepository
+
+BACKENDS: Dict[str, Callable[[str], CustomerRepository]] = {
+    'json': lambda directory: JSONRepository(os.path.join(directory, 'customers.json')),
+    'json-buffered': lambda directory: JSONRepository(os.path.join(directory, 'customers.json'), buffered=True),
+    'jsonl': lambda directory: JSONLinesRepository(os.path.join(directory, 'customers.jsonl')),
+    'sqlite': lambda directory: SQLiteRepository(os.path.join(directory, 'customers.db')),
+    'sqlite-sharded': lambda directory: ShardedSQLiteRepository(os.path.join(directory, 'shards'), shards=4),
+}
+
+
+def percentiles(samples: List[float]) -> Optional[dict]:
+    """Nearest-rank latency percentiles in milliseconds."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def rank(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+
+    return {"p50": rank(50), "p95": rank(95), "p99": rank(99), "max": ordered[-1] * 1000}
+
+
+def peak_memory(operation: Callable[[], object]) -> int:
+    """Runs the operation under tracemalloc and returns its peak traced allocation in bytes."""
+    tracemalloc.start()
+    try:
+        operation()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def result(backend: str, scale: int, operation: str, records: int, seconds: float,
+           latencies: Optional[List[float]] = None, memory: Optional[int] = None) -> dict:
+    return {
+        "backend": backend,
+        "scale": scale,
+        "operation": operation,
+        "records": records,
+        "seconds": seconds,
+        "throughput_per_s": records / seconds if seconds else None,
+        "latency_ms": percentiles(latencies or []),
+        "peak_memory_bytes": memory
+    }
+
+
+def timed(operation: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    operation()
+    return time.perf_counter() - start
+
+
+def bulk_load_fresh(backend: str, scale: int, seed: int) -> None:
+    """Loads `scale` customers into a new, empty store (the memory pass of the bulk load)."""
+    with tempfile.TemporaryDirectory() as directory:
+        repo = BACKENDS[backend](directory)
+        try:
+            repo.save_many(generate_customers(scale, seed))
+        finally:
+            repo.close()
+
+
+def bench_backend(backend: str, scale: int, seed: int, samples: int, save_samples: int,
+                  measure_memory: bool) -> List[dict]:
+    """Runs every repository benchmark for one backend at one scale."""
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        repo = BACKENDS[backend](directory)
+        ids = []
+
+        def load():
+            for customer in generate_customers(scale, seed):
+                ids.append(customer.customer_id)
+                yield customer
+
+        # Bulk load through save_many
+        seconds = timed(lambda: repo.save_many(load()))
+        memory = peak_memory(lambda: bulk_load_fresh(backend, scale, seed)) if measure_memory else None
+        results.append(result(backend, scale, 'bulk_load', scale, seconds, memory=memory))
+
+        # Single saves of new customers on top of the loaded store
+        latencies = []
+        for customer in generate_customers(save_samples, seed, start=scale):
+            latencies.append(timed(lambda: repo.save(customer)))
+        results.append(result(backend, scale, 'save', save_samples, sum(latencies), latencies))
+
+        # Full reads
+        total = scale + save_samples
+        seconds = timed(repo.get_all)
+        memory = peak_memory(repo.get_all) if measure_memory else None
+        results.append(result(backend, scale, 'get_all', total, seconds, memory=memory))
+
+        def drain():
+            for _ in repo.iter_all():
+                pass
+
+        seconds = timed(drain)
+        memory = peak_memory(drain) if measure_memory else None
+        results.append(result(backend, scale, 'iter_all', total, seconds, memory=memory))
+
+        # Point lookups on random existing IDs
+        rng = random.Random(seed)
+        latencies = [timed(lambda: repo.find_by_id(customer_id))
+                     for customer_id in rng.choices(ids, k=samples)] if ids else []
+        results.append(result(backend, scale, 'find_by_id', len(latencies), sum(latencies), latencies))
+
+        repo.close()
+    return results
+
+
+def bench_migration(scale: int, seed: int, measure_memory: bool) -> dict:
+    """Times migrate_data.run_migration on a JSON store of the given scale."""
+    from migrate_data import run_migration
+
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, 'customers.json')
+        source = JSONRepository(json_path)
+        source.save_many(generate_customers(scale, seed))
+
+        def migrate(db_name: str) -> None:
+            # Every pass migrates into a new database, so none of them upserts over another's rows
+            db_path = os.path.join(directory, db_name)
+            # The utility reports progress on stdout; keep the benchmark output machine-readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                run_migration(json_path, db_path, resume=False)
+
+        seconds = timed(lambda: migrate('timed.db'))
+        memory = peak_memory(lambda: migrate('memory.db')) if measure_memory else None
+        return result('json->sqlite', scale, 'migration', scale, seconds, memory=memory)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the SCM storage backends.")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--backends', nargs='+', choices=sorted(BACKENDS), default=sorted(BACKENDS))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--samples', type=int, default=1000, help="find_by_id lookups per run")
+    parser.add_argument('--save-samples', type=int, default=100,
+                        help="single saves per run (each one rewrites the file on the 'json' backend)")
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc peak memory passes")
+    parser.add_argument('--skip-migration', action='store_true')
+    parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "results": []
+    }
+    for scale in args.scales:
+        for backend in args.backends:
+            print(f"Benchmarking {backend} with {scale} customers...", file=sys.stderr)
+            report["results"].extend(bench_backend(backend, scale, args.seed, args.samples,
+                                                   args.save_samples, not args.no_memory))
+        if not args.skip_migration:
+            print(f"Benchmarking migration with {scale} customers...", file=sys.stderr)
+            report["results"].append(bench_migration(scale, args.seed, not args.no_memory))
+
+    output = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
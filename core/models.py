@@ -2,6 +2,10 @@ from abc import ABC, abstractmethod
 from core.validators import DataValidator
 
 class Customer(ABC):
+    # Fixed attribute slots instead of a per-instance __dict__ keep large working sets compact.
+    # Subclasses declare only the attributes they add (an empty tuple if none).
+    __slots__ = ('_customer_id', '_name', '_email', '_phone')
+
     def __init__(self, customer_id: str, name: str, email: str, phone: str):
         self._customer_id = customer_id
         self.name = name
@@ -55,7 +59,23 @@ class Customer(ABC):
         """Calculate the customer's value based on their type."""
         pass
 
-    # --- Persistence Helper ---
+    # --- Persistence Helpers ---
+    @classmethod
+    def from_row(cls, data: dict, verify: bool = False) -> "Customer":
+        """
+        Rebuilds a customer from stored data (the format produced by to_dict).
+        Stored data was validated when it was written, so fields are set directly without
+        going through the setters. Use verify=True to validate it again (e.g. to audit a store).
+        """
+        if verify:
+            return cls(data['id'], data['name'], data['email'], data['phone'])
+        obj = cls.__new__(cls)
+        obj._customer_id = data['id']
+        obj._name = data['name']
+        obj._email = data['email']
+        obj._phone = data['phone']
+        return obj
+
     def to_dict(self) -> dict:
         """Converts the object to a dictionary for JSON/SQLite."""
         return {
@@ -82,6 +102,12 @@ class Customer(ABC):
 
 
 class RegularCustomer(Customer):
+    __slots__ = ()
+
+    # Pricing constants, shared with the storage-side aggregations in data/analytics.py
+    BASE_VALUE = 100.0
+    DISCOUNT_RATE = 0.05
+
     def __init__(self, customer_id: str, name: str, email: str, phone: str):
         super().__init__(customer_id, name, email, phone)
 
@@ -91,13 +117,18 @@ class RegularCustomer(Customer):
 
     def calculate_value(self) -> float:
         """Regular customers have a fixed base value."""
-        return 100.0
+        return self.BASE_VALUE
 
     def calculate_discount(self) -> float:
         """Applies a standard 5% discount over the base value."""
-        return 0.05 * self.calculate_value()
+        return self.DISCOUNT_RATE * self.calculate_value()
 
 class PremiumCustomer(Customer):
+    __slots__ = ('_loyalty_points',)
+
+    BASE_FEE = 200.0
+    POINT_VALUE = 0.5
+
     def __init__(self, customer_id: str, name: str, email: str, phone: str, loyalty_points: int = 0):
         super().__init__(customer_id, name, email, phone)
         # Premium customers have loyalty points
@@ -113,15 +144,33 @@ class PremiumCustomer(Customer):
             raise ValueError("Loyalty points cannot be negative")
         self._loyalty_points = value
 
+    @classmethod
+    def from_row(cls, data: dict, verify: bool = False) -> "PremiumCustomer":
+        """Rebuilds a premium customer from stored data, including its loyalty points."""
+        loyalty_points = data.get('loyalty_points') or 0
+        if verify:
+            obj = cls(data['id'], data['name'], data['email'], data['phone'])
+            obj.loyalty_points = loyalty_points
+            return obj
+        obj = super().from_row(data)
+        obj._loyalty_points = loyalty_points
+        return obj
+
     def get_details(self) -> str:
         """Returns detailed info including loyalty status."""
         return f"PREMIUM CUSTOMER - {self.name} | Loyalty points: {self.loyalty_points}"
 
     def calculate_value(self) -> float:
         """Premium customers have a base rate plus a bonus for loyalty points."""
-        base_premium_fee = 200.0
-        point_bonus = self.loyalty_points * 0.5
-        return base_premium_fee + point_bonus
+        return self.compute_value(self.loyalty_points)
+
+    @classmethod
+    def compute_value(cls, loyalty_points):
+        """
+        The premium value formula on its own. Works on a number or on a whole column
+        (e.g. a NumPy array of loyalty points).
+        """
+        return cls.BASE_FEE + loyalty_points * cls.POINT_VALUE
 
     def to_dict(self) -> dict:
         """Extends the base dictionary with premium-specific data."""
@@ -132,6 +181,11 @@ class PremiumCustomer(Customer):
         return data
 
 class CorporateCustomer(Customer):
+    __slots__ = ('_company_name', '_tax_id', '_position', '_seniority')
+
+    BASE_VALUE = 500.0
+    SENIORITY_VALUE = 50
+
     def __init__(self, customer_id: str, name: str, email: str, phone: str, company_name: str,
                  tax_id: str, position: str, seniority: int = 0):
         super().__init__(customer_id, name, email, phone)
@@ -158,13 +212,31 @@ class CorporateCustomer(Customer):
     def seniority(self):
         return self._seniority
 
+    @classmethod
+    def from_row(cls, data: dict, verify: bool = False) -> "CorporateCustomer":
+        """Rebuilds a corporate customer from stored data, including its company fields."""
+        if verify:
+            return cls(data['id'], data['name'], data['email'], data['phone'], data['company_name'],
+                       data['tax_id'], data['position'], data.get('seniority') or 0)
+        obj = super().from_row(data)
+        obj._company_name = data['company_name']
+        obj._tax_id = data['tax_id']
+        obj._position = data['position']
+        obj._seniority = data.get('seniority') or 0
+        return obj
+
     def get_details(self) -> str:
         """Returns corporate contact details."""
         return f"CORPORATE: {self.company_name} | Contact: {self.name} ({self.position}) | Seniority: {self.seniority} years"
 
     def calculate_value(self) -> float:
         """Corporate value is higher due to bulk contracts."""
-        return 500.0 + (self.seniority * 50)
+        return self.compute_value(self.seniority)
+
+    @classmethod
+    def compute_value(cls, seniority):
+        """The corporate value formula on its own. Works on a number or on a whole column."""
+        return cls.BASE_VALUE + (seniority * cls.SENIORITY_VALUE)
 
     def to_dict(self) -> dict:
         """Includes corporate fields in the dictionary."""
@@ -172,6 +244,11 @@ class CorporateCustomer(Customer):
         data.update({
             "company_name": self.company_name,
             "tax_id": self.tax_id,
-            "position": self.position
+            "position": self.position,
+            "seniority": self.seniority
         })
-        return data
\ No newline at end of file
+        return data
+
+
+# Maps the stored 'type' value to its class, used by the repositories to rehydrate customers
+CUSTOMER_TYPES = {cls.__name__: cls for cls in (RegularCustomer, PremiumCustomer, CorporateCustomer)}
@@ -0,0 +1,208 @@
+from typing import Dict, List, Optional, Tuple
+from core.models import CorporateCustomer, PremiumCustomer, RegularCustomer
+from data.repository import CustomerRepository, SQLiteRepository, unwrap
+from utils.metrics import instrumented
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional: the column computations fall back to plain Python
+    np = None
+
+CUSTOMER_TYPE_NAMES = (RegularCustomer.__name__, PremiumCustomer.__name__, CorporateCustomer.__name__)
+
+
+class _Columns:
+    """The stored fields the reports need, one list per column, read in a single pass over the records."""
+
+    def __init__(self, records):
+        self.type_counts = dict.fromkeys(CUSTOMER_TYPE_NAMES, 0)
+        self.loyalty_points: List[int] = []
+        self.seniority: List[int] = []
+        self.companies: List[str] = []
+        for record in records:
+            customer_type = record.get('type')
+            if customer_type not in self.type_counts:
+                continue
+            self.type_counts[customer_type] += 1
+            # Missing values default like in Customer.from_row
+            if customer_type == 'PremiumCustomer':
+                self.loyalty_points.append(record.get('loyalty_points') or 0)
+            elif customer_type == 'CorporateCustomer':
+                self.seniority.append(record.get('seniority') or 0)
+                self.companies.append(record.get('company_name'))
+
+
+class PortfolioAnalytics:
+    """
+    Portfolio aggregates computed straight from storage, without building Customer objects.
+    SQLiteRepository is aggregated in SQL; every other repository is read once through
+    iter_records() and computed column by column (with NumPy when it is installed).
+    The values use the pricing constants and formulas of core/models.py, so the totals match
+    summing calculate_value() and calculate_discount() over get_all().
+    """
+
+    def __init__(self, repository: CustomerRepository, use_numpy: Optional[bool] = None):
+        # Behind a wrapper such as CachedRepository, read the store itself
+        self.repository = unwrap(repository)
+        self.use_numpy = np is not None if use_numpy is None else use_numpy
+        if self.use_numpy and np is None:
+            raise ImportError("use_numpy=True requires NumPy")
+
+    @property
+    def _in_sql(self) -> bool:
+        return isinstance(self.repository, SQLiteRepository)
+
+    def _load_columns(self) -> _Columns:
+        return _Columns(self.repository.iter_records())
+
+    def _sql(self, query: str, params: tuple = ()) -> list:
+        return self.repository.fetch(query, params)
+
+    # --- Reports ---
+    @instrumented('value_by_type')
+    def value_by_type(self, columns: Optional[_Columns] = None) -> Dict[str, dict]:
+        """
+        Customer count, total and average calculate_value() per customer type, plus the total
+        calculate_discount() (only regular customers get a discount).
+        """
+        if self._in_sql:
+            # Same formulas as the compute_value() classmethods, written in SQL
+            rows = self._sql('''
+                SELECT type, COUNT(*),
+                       SUM(CASE type
+                               WHEN 'RegularCustomer' THEN ?
+                               WHEN 'PremiumCustomer' THEN ? + COALESCE(loyalty_points, 0) * ?
+                               ELSE ? + (COALESCE(seniority, 0) * ?)
+                           END)
+                FROM customers
+                WHERE type IN (?, ?, ?)
+                GROUP BY type
+            ''', (RegularCustomer.BASE_VALUE, PremiumCustomer.BASE_FEE, PremiumCustomer.POINT_VALUE,
+                  CorporateCustomer.BASE_VALUE, CorporateCustomer.SENIORITY_VALUE, *CUSTOMER_TYPE_NAMES))
+            totals = {customer_type: (count, total) for customer_type, count, total in rows}
+        else:
+            columns = columns or self._load_columns()
+            counts = columns.type_counts
+            totals = {
+                'RegularCustomer': (counts['RegularCustomer'],
+                                    counts['RegularCustomer'] * RegularCustomer.BASE_VALUE),
+                'PremiumCustomer': (counts['PremiumCustomer'],
+                                    self._column_sum(PremiumCustomer.compute_value, columns.loyalty_points)),
+                'CorporateCustomer': (counts['CorporateCustomer'],
+                                      self._column_sum(CorporateCustomer.compute_value, columns.seniority)),
+            }
+
+        report = {}
+        for customer_type in CUSTOMER_TYPE_NAMES:
+            count, total = totals.get(customer_type, (0, 0.0))
+            total = float(total or 0.0)
+            discount = RegularCustomer.DISCOUNT_RATE * total if customer_type == 'RegularCustomer' else 0.0
+            report[customer_type] = {
+                "count": count,
+                "total_value": total,
+                "average_value": total / count if count else 0.0,
+                "total_discount": discount
+            }
+        return report
+
+    @instrumented('loyalty_distribution')
+    def loyalty_distribution(self, bucket_size: int = 500, columns: Optional[_Columns] = None) -> dict:
+        """
+        Summary of the premium customers' loyalty points and a histogram of `bucket_size` wide
+        buckets, as (bucket start, customer count) pairs in ascending order.
+        """
+        if bucket_size < 1:
+            raise ValueError('bucket_size must be a positive number')
+
+        if self._in_sql:
+            points = 'COALESCE(loyalty_points, 0)'
+            count, total, low, high = self._sql(
+                f"SELECT COUNT(*), SUM({points}), MIN({points}), MAX({points}) "
+                f"FROM customers WHERE type = 'PremiumCustomer'")[0]
+            buckets = self._sql(
+                f"SELECT ({points} / ?) * ? AS bucket, COUNT(*) FROM customers "
+                f"WHERE type = 'PremiumCustomer' GROUP BY bucket ORDER BY bucket", (bucket_size, bucket_size))
+        else:
+            values = (columns or self._load_columns()).loyalty_points
+            count = len(values)
+            if self.use_numpy and values:
+                array = np.asarray(values, dtype=np.int64)
+                total, low, high = int(array.sum()), int(array.min()), int(array.max())
+                bucket_counts = np.bincount(array // bucket_size)
+                buckets = [(int(i) * bucket_size, int(bucket_counts[i])) for i in np.flatnonzero(bucket_counts)]
+            else:
+                total = sum(values)
+                low, high = (min(values), max(values)) if values else (None, None)
+                histogram: Dict[int, int] = {}
+                for value in values:
+                    bucket = (value // bucket_size) * bucket_size
+                    histogram[bucket] = histogram.get(bucket, 0) + 1
+                buckets = sorted(histogram.items())
+
+        return {
+            "count": count,
+            "total_points": int(total or 0),
+            "average_points": (total or 0) / count if count else 0.0,
+            "min_points": low,
+            "max_points": high,
+            "buckets": [(int(start), int(n)) for start, n in buckets]
+        }
+
+    @instrumented('corporate_value_by_company')
+    def corporate_value_by_company(self, columns: Optional[_Columns] = None) -> Dict[str, dict]:
+        """Corporate customer count, total and average calculate_value() per company, by company name."""
+        if self._in_sql:
+            rows = self._sql('''
+                SELECT company_name, COUNT(*), SUM(? + (COALESCE(seniority, 0) * ?))
+                FROM customers
+                WHERE type = 'CorporateCustomer'
+                GROUP BY company_name
+            ''', (CorporateCustomer.BASE_VALUE, CorporateCustomer.SENIORITY_VALUE))
+        else:
+            columns = columns or self._load_columns()
+            rows = self._group_sum(columns.companies, columns.seniority, CorporateCustomer.compute_value)
+
+        return {
+            company: {
+                "count": count,
+                "total_value": float(total),
+                "average_value": float(total) / count
+            }
+            for company, count, total in sorted(rows, key=lambda row: (row[0] is None, row[0] or ''))
+        }
+
+    @instrumented('report')
+    def report(self, bucket_size: int = 500) -> dict:
+        """Every aggregate at once. Non-SQL stores are read only once for the whole report."""
+        columns = None if self._in_sql else self._load_columns()
+        return {
+            "value_by_type": self.value_by_type(columns),
+            "loyalty_distribution": self.loyalty_distribution(bucket_size, columns),
+            "corporate_value_by_company": self.corporate_value_by_company(columns)
+        }
+
+    # --- Column Helpers ---
+    def _column_sum(self, formula, values: List[int]) -> float:
+        """Applies a compute_value() formula to a whole column and sums the results."""
+        if self.use_numpy:
+            return float(formula(np.asarray(values, dtype=np.float64)).sum()) if values else 0.0
+        return sum(formula(value) for value in values)
+
+    def _group_sum(self, keys: List[str], values: List[int], formula) -> List[Tuple[str, int, float]]:
+        """Groups a column by key and returns (key, count, sum of formula(value)) rows."""
+        if self.use_numpy and keys:
+            # None (a company-less record) can't be sorted with strings; group it under its own code
+            unique_keys = list(dict.fromkeys(keys))
+            codes = {key: i for i, key in enumerate(unique_keys)}
+            inverse = np.fromiter((codes[key] for key in keys), dtype=np.int64, count=len(keys))
+            amounts = formula(np.asarray(values, dtype=np.float64))
+            counts = np.bincount(inverse, minlength=len(unique_keys))
+            sums = np.bincount(inverse, weights=amounts, minlength=len(unique_keys))
+            return [(key, int(counts[i]), float(sums[i])) for i, key in enumerate(unique_keys)]
+
+        groups: Dict[str, list] = {}
+        for key, value in zip(keys, values):
+            group = groups.setdefault(key, [0, 0.0])
+            group[0] += 1
+            group[1] += formula(value)
+        return [(key, count, total) for key, (count, total) in groups.items()]
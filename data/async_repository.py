@@ -0,0 +1,159 @@
+import asyncio
+import os
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+from core.models import Customer
+from data.repository import CustomerRepository, unwrap
+
+
+class AsyncCustomerRepository(ABC):
+    """Asynchronous counterpart of CustomerRepository for use inside an asyncio event loop."""
+
+    @abstractmethod
+    async def save(self, customer: Customer) -> None:
+        pass
+
+    @abstractmethod
+    async def find_by_id(self, customer_id: str) -> Optional[Customer]:
+        pass
+
+    @abstractmethod
+    async def get_all(self) -> List[Customer]:
+        pass
+
+    @abstractmethod
+    def iter_all(self, batch_size: int = 500) -> AsyncIterator[Customer]:
+        """Streams every customer, loading `batch_size` records at a time."""
+        pass
+
+    async def save_many(self, customers: Iterable[Customer], chunk_size: int = 500) -> List[Tuple[Any, Exception]]:
+        """Saves many customers, returning the (customer, error) pairs that failed."""
+        failures = []
+        for customer in customers:
+            try:
+                await self.save(customer)
+            except Exception as e:
+                failures.append((customer, e))
+        return failures
+
+    async def close(self) -> None:
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+# One lock per storage file, shared by every adapter in the process, so writes to the
+# same file are serialized even when several repositories point at it
+_write_locks: Dict[str, threading.Lock] = {}
+_write_locks_guard = threading.Lock()
+
+
+def _write_lock_for(repository: CustomerRepository) -> threading.Lock:
+    """Returns the process-wide write lock of the file (or sharded store directory) behind a repository."""
+    repository = unwrap(repository)
+    path = (getattr(repository, 'file_path', None) or getattr(repository, 'db_path', None)
+            or getattr(repository, 'directory', None))
+    key = os.path.abspath(path) if path else f'repository-{id(repository)}'
+    with _write_locks_guard:
+        return _write_locks.setdefault(key, threading.Lock())
+
+
+class AsyncRepositoryAdapter(AsyncCustomerRepository):
+    """
+    Runs a synchronous CustomerRepository off the event loop.
+    Reads use a bounded pool of `read_workers` threads. Writes use a separate single thread
+    and a per-file lock, so they are serialized and lookups never queue behind a slow write
+    (e.g. a full JSON rewrite). Reads therefore run while a write is in progress: the
+    repository must support that. The repositories in this package do (the buffered
+    JSONRepository and JSONLinesRepository guard their in-memory indexes with a lock).
+    """
+
+    def __init__(self, repository: CustomerRepository, read_workers: int = 4):
+        self.repository = repository
+        self._read_executor = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix='scm-read')
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='scm-write')
+        self._write_lock = _write_lock_for(repository)
+        # Repository iterators behind unfinished iter_all() streams, closed by close()
+        self._open_iterators = set()
+        self._closed = False
+
+    async def _run_read(self, func: Callable, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._read_executor, func, *args)
+
+    async def _run_write(self, func: Callable, *args):
+        def locked():
+            with self._write_lock:
+                return func(*args)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._write_executor, locked)
+
+    async def save(self, customer: Customer) -> None:
+        await self._run_write(self.repository.save, customer)
+
+    async def save_many(self, customers: Iterable[Customer], chunk_size: int = 500) -> List[Tuple[Any, Exception]]:
+        return await self._run_write(self.repository.save_many, customers, chunk_size)
+
+    async def find_by_id(self, customer_id: str) -> Optional[Customer]:
+        return await self._run_read(self.repository.find_by_id, customer_id)
+
+    async def get_all(self) -> List[Customer]:
+        return await self._run_read(self.repository.get_all)
+
+    async def query(self, filter: Optional[Dict[str, Any]] = None, order_by: str = 'id', limit: Optional[int] = 100,
+                    after: Optional[str] = None) -> Tuple[List[Customer], Optional[str]]:
+        """Returns one page of customers and the next cursor (see CustomerRepository.query)."""
+        return await self._run_read(self.repository.query, filter, order_by, limit, after)
+
+    async def iter_all(self, batch_size: int = 500) -> AsyncIterator[Customer]:
+        """Pulls one batch at a time from the repository's iter_all in the read pool."""
+        iterator = self.repository.iter_all(batch_size)
+        self._open_iterators.add(iterator)
+        try:
+            while True:
+                batch = await self._run_read(lambda: list(islice(iterator, batch_size)))
+                if not batch:
+                    break
+                for customer in batch:
+                    yield customer
+        finally:
+            # Release the underlying cursor or file if the consumer stops early. A stream
+            # abandoned with `break` may only be finalized after close(): the pool is gone
+            # then, and close() has already closed the iterator (closing again is a no-op)
+            self._open_iterators.discard(iterator)
+            if self._closed:
+                iterator.close()
+            else:
+                await self._run_read(iterator.close)
+
+    async def search(self, text: str, fields: Optional[Iterable[str]] = None, limit: int = 20,
+                     offset: int = 0) -> List[Customer]:
+        """Ranked prefix search (see CustomerRepository.search)."""
+        return await self._run_read(self.repository.search, text, fields, limit, offset)
+
+    async def close(self) -> None:
+        """
+        Waits for pending work, stops the thread pools, closes the iter_all() streams still
+        open and then the repository.
+        """
+        loop = asyncio.get_running_loop()
+        self._closed = True
+        iterators = list(self._open_iterators)
+        self._open_iterators.clear()
+
+        def shutdown():
+            self._read_executor.shutdown(wait=True)
+            for iterator in iterators:
+                iterator.close()
+            self._write_executor.shutdown(wait=True)
+            self.repository.close()
+
+        await loop.run_in_executor(None, shutdown)
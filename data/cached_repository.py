@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+from core.models import Customer
+from data.repository import CustomerRepository, RepositoryWrapper
+from utils.metrics import instrumented
+
+
+class CachedRepository(RepositoryWrapper):
+    """
+    Read-through LRU cache of hydrated customers in front of any CustomerRepository.
+    `find_by_id` is served from the cache when possible; every other read goes to the
+    wrapped repository (query pages are not cached). Writes update (save) or invalidate
+    (save_many) the cached entries.
+    """
+
+    def __init__(self, repository: CustomerRepository, max_size: int = 10000, ttl: Optional[float] = None):
+        """
+        Keeps at most `max_size` customers. With `ttl` (seconds), entries older than that
+        are reloaded from the wrapped repository.
+        """
+        super().__init__(repository)
+        self.max_size = max_size
+        self.ttl = ttl
+        # customer_id -> (customer, expiry time or None), least recently used first
+        self._cache: "OrderedDict[str, Tuple[Customer, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped when a write starts and ends, so a slow read-through can't cache a stale object
+        self._generation = 0
+        self._writes_in_progress = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    # --- Cache Helpers ---
+    def _put(self, customer: Customer) -> None:
+        """Stores a customer as the most recently used entry, evicting the oldest if full. Lock must be held."""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._cache[customer.customer_id] = (customer, expires_at)
+        self._cache.move_to_end(customer.customer_id)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+    def _begin_write(self) -> None:
+        with self._lock:
+            self._writes_in_progress += 1
+            self._generation += 1
+
+    def _end_write(self) -> None:
+        with self._lock:
+            self._writes_in_progress -= 1
+            self._generation += 1
+
+    def invalidate(self, customer_id: str) -> None:
+        """Drops a customer from the cache."""
+        with self._lock:
+            self._cache.pop(customer_id, None)
+
+    def clear(self) -> None:
+        """Drops every cached customer. Counters are kept."""
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        """Returns the cache counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self._cache),
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+    # --- Repository Interface ---
+    @instrumented('find_by_id')
+    def find_by_id(self, customer_id: str) -> Optional[Customer]:
+        """Returns the cached customer, loading it from the wrapped repository on a miss."""
+        with self._lock:
+            entry = self._cache.get(customer_id)
+            if entry is not None:
+                customer, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._cache.move_to_end(customer_id)
+                    self.hits += 1
+                    return customer
+                del self._cache[customer_id]
+                self.expirations += 1
+            self.misses += 1
+            generation = self._generation
+
+        customer = self.repository.find_by_id(customer_id)
+        if customer is not None:
+            with self._lock:
+                # Skip caching if a write started or finished while we were reading
+                if self._generation == generation and not self._writes_in_progress:
+                    self._put(customer)
+        return customer
+
+    @instrumented('save')
+    def save(self, customer: Customer) -> None:
+        """Saves through the wrapped repository and refreshes the cached entry."""
+        self._begin_write()
+        try:
+            self.repository.save(customer)
+        except Exception:
+            self.invalidate(customer.customer_id)
+            raise
+        else:
+            with self._lock:
+                if customer.customer_id in self._cache:
+                    self._put(customer)
+        finally:
+            self._end_write()
+
+    @instrumented('save_many')
+    def save_many(self, customers: Iterable[Customer], chunk_size: int = 500) -> List[Tuple[Any, Exception]]:
+        """Saves through the wrapped repository, invalidating the cached entries of the written customers."""
+        def invalidating(items: Iterable[Customer]) -> Iterator[Customer]:
+            for customer in items:
+                customer_id = getattr(customer, 'customer_id', None)
+                if customer_id is not None:
+                    self.invalidate(customer_id)
+                yield customer
+
+        self._begin_write()
+        try:
+            return self.repository.save_many(invalidating(customers), chunk_size)
+        finally:
+            self._end_write()
+
+    def close(self) -> None:
+        """Clears the cache and closes the wrapped repository."""
+        self.clear()
+        self.repository.close()
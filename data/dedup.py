@@ -0,0 +1,322 @@
+import hashlib
+import threading
+import unicodedata
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from core.models import Customer
+from data.repository import CustomerRepository, RepositoryWrapper
+from utils.exceptions import DuplicateCustomerError
+from utils.logger import log_info
+from utils.metrics import instrumented
+
+# Fields a duplicate can be recognized by
+BLOCKING_FIELDS = ('email', 'phone', 'name')
+# Fields that identify a person on their own. A shared name only makes a possible duplicate,
+# unless a second field matches too
+STRONG_FIELDS = ('email', 'phone')
+# Phones are compared by their last digits, so '+54 11 ...' and '11 ...' match (9 = shortest valid phone)
+PHONE_DIGITS = 9
+
+
+# --- Normalization ---
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    """Lower-cases an email and drops a '+tag' from its local part ('Ana+shop@X.com' -> 'ana@x.com')."""
+    if not email or '@' not in email:
+        return None
+    local, _, domain = email.strip().lower().rpartition('@')
+    local = local.split('+', 1)[0]
+    return f"{local}@{domain}" if local and domain else None
+
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """Keeps the last PHONE_DIGITS digits of a phone, ignoring '+', spaces, dashes and prefixes."""
+    digits = ''.join(ch for ch in phone if ch.isdigit()) if phone else ''
+    return digits[-PHONE_DIGITS:] if len(digits) >= PHONE_DIGITS else None
+
+
+def normalize_name(name: Optional[str]) -> Optional[str]:
+    """Lower-cases a name, removes accents and punctuation and sorts its words ('Díaz, Ana' -> 'ana diaz')."""
+    if not name:
+        return None
+    text = unicodedata.normalize('NFKD', name)
+    text = ''.join(ch if ch.isalnum() else ' ' for ch in text if not unicodedata.combining(ch))
+    words = sorted(text.lower().split())
+    return ' '.join(words) if words else None
+
+
+_NORMALIZERS = {'email': normalize_email, 'phone': normalize_phone, 'name': normalize_name}
+
+
+def blocking_keys(record: dict, fields: Tuple[str, ...] = BLOCKING_FIELDS) -> List[Tuple[str, int]]:
+    """
+    Returns the (field, key) pairs of a stored record: a 64-bit hash of each normalized field.
+    Customers sharing a key are duplicate candidates. Hashing keeps every key the same small
+    size whatever the value, and the index never holds the emails and phones themselves.
+    """
+    keys = []
+    for field in fields:
+        value = _NORMALIZERS[field](record.get(field))
+        if value is not None:
+            digest = hashlib.blake2b(f"{field}:{value}".encode('utf-8'), digest_size=8).digest()
+            keys.append((field, int.from_bytes(digest, 'big')))
+    return keys
+
+
+def is_duplicate(fields: Iterable[str]) -> bool:
+    """Whether the fields two customers share are enough to call them the same person."""
+    fields = set(fields)
+    return len(fields) >= 2 or any(field in STRONG_FIELDS for field in fields)
+
+
+def _parse_fields(fields: Iterable[str]) -> Tuple[str, ...]:
+    fields = tuple(fields)
+    for field in fields:
+        if field not in _NORMALIZERS:
+            raise ValueError(f'Unknown blocking field: {field}')
+    if not fields:
+        raise ValueError('At least one blocking field is needed')
+    return fields
+
+
+class DuplicateIndex:
+    """
+    Blocking keys of every customer and the customers sharing each key (a "block").
+    Blocks larger than `max_block_size` (a very common name, a shared switchboard phone) say
+    little about who is a duplicate and are ignored, which also keeps the work per customer
+    bounded: building the index and clustering it are linear in the number of customers.
+    """
+
+    def __init__(self, fields: Iterable[str] = BLOCKING_FIELDS, max_block_size: int = 20):
+        if max_block_size < 2:
+            raise ValueError('max_block_size must be at least 2')
+        self.fields = _parse_fields(fields)
+        self.max_block_size = max_block_size
+        # key -> (field, IDs of the customers with that key)
+        self._blocks: Dict[int, Tuple[str, Dict[str, None]]] = {}
+        # customer_id -> its keys
+        self._keys: Dict[str, List[Tuple[str, int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, record: dict) -> None:
+        """Indexes a stored record, replacing the keys of its previous version."""
+        customer_id = record['id']
+        self.remove(customer_id)
+        keys = blocking_keys(record, self.fields)
+        for field, key in keys:
+            self._blocks.setdefault(key, (field, {}))[1][customer_id] = None
+        self._keys[customer_id] = keys
+
+    def remove(self, customer_id: str) -> None:
+        for _, key in self._keys.pop(customer_id, ()):
+            ids = self._blocks[key][1]
+            del ids[customer_id]
+            if not ids:
+                del self._blocks[key]
+
+    def matches(self, record: dict) -> Dict[str, List[str]]:
+        """
+        Returns the other indexed customers sharing a key with `record`: ID -> fields that
+        matched. These are candidates: see is_duplicate for which ones are duplicates.
+        """
+        found: Dict[str, List[str]] = {}
+        for field, key in blocking_keys(record, self.fields):
+            block = self._blocks.get(key)
+            if block is None or len(block[1]) > self.max_block_size:
+                continue
+            for other_id in block[1]:
+                if other_id != record['id']:
+                    found.setdefault(other_id, []).append(field)
+        return found
+
+    def _link(self) -> Tuple[Dict[str, str], List[Tuple[str, str]]]:
+        """
+        Union-find over the blocks of the strong fields. Returns the root of every linked
+        customer and the (customer, field) pair of every block that linked something.
+        """
+        parent: Dict[str, str] = {}
+
+        def find(customer_id: str) -> str:
+            root = customer_id
+            while parent[root] != root:
+                root = parent[root]
+            while customer_id != root:
+                parent[customer_id], customer_id = root, parent[customer_id]
+            return root
+
+        linked_by: List[Tuple[str, str]] = []
+        for field, ids in self._blocks.values():
+            if field not in STRONG_FIELDS or not 2 <= len(ids) <= self.max_block_size:
+                continue
+            first, *others = ids
+            parent.setdefault(first, first)
+            for other_id in others:
+                parent.setdefault(other_id, other_id)
+                root, other_root = find(first), find(other_id)
+                if root != other_root:
+                    parent[other_root] = root
+            linked_by.append((first, field))
+        return {customer_id: find(customer_id) for customer_id in parent}, linked_by
+
+    def clusters(self) -> List[dict]:
+        """
+        Groups the customers sharing an email or phone, directly or through each other (A
+        shares an email with B, B a phone with C). Returns one entry per group of two or more,
+        largest first: the IDs and the fields that linked them (including a shared name).
+        """
+        roots, linked_by = self._link()
+        groups: Dict[str, dict] = {}
+        for customer_id, root in roots.items():
+            group = groups.setdefault(root, {"ids": [], "fields": set()})
+            group["ids"].append(customer_id)
+        for customer_id, field in linked_by:
+            groups[roots[customer_id]]["fields"].add(field)
+        for field, ids in self._blocks.values():
+            if field in STRONG_FIELDS or not 2 <= len(ids) <= self.max_block_size:
+                continue
+            # A name shared by two customers of a group corroborates it
+            seen = set()
+            for customer_id in ids:
+                root = roots.get(customer_id)
+                if root in seen:
+                    groups[root]["fields"].add(field)
+                elif root is not None:
+                    seen.add(root)
+
+        clusters = [{"ids": sorted(group["ids"]), "fields": [f for f in self.fields if f in group["fields"]]}
+                    for group in groups.values()]
+        clusters.sort(key=lambda cluster: (-len(cluster["ids"]), cluster["ids"][0]))
+        return clusters
+
+    def possible_duplicates(self) -> List[dict]:
+        """
+        Customers sharing only a weak field (a name) with each other: worth a look, but not
+        merged into clusters nor rejected. Returns one entry per shared value, largest first,
+        leaving out the ones whose customers are already in the same cluster.
+        """
+        roots, _ = self._link()
+        possible = []
+        for field, ids in self._blocks.values():
+            if field in STRONG_FIELDS or not 2 <= len(ids) <= self.max_block_size:
+                continue
+            if len({roots.get(customer_id, customer_id) for customer_id in ids}) > 1:
+                possible.append({"ids": sorted(ids), "fields": [field]})
+        possible.sort(key=lambda entry: (-len(entry["ids"]), entry["ids"][0]))
+        return possible
+
+    def skipped_blocks(self) -> int:
+        """Number of keys shared by more than max_block_size customers (ignored)."""
+        return sum(1 for _, ids in self._blocks.values() if len(ids) > self.max_block_size)
+
+
+def build_index(repository: CustomerRepository, fields: Iterable[str] = BLOCKING_FIELDS,
+                max_block_size: int = 20) -> DuplicateIndex:
+    """Indexes every stored customer in one pass over iter_records() (no Customer objects are built)."""
+    index = DuplicateIndex(fields, max_block_size)
+    for record in repository.iter_records():
+        index.add(record)
+    return index
+
+
+@instrumented('find_duplicates', component='dedup')
+def find_duplicates(repository: CustomerRepository, fields: Iterable[str] = BLOCKING_FIELDS,
+                    max_block_size: int = 20) -> dict:
+    """
+    Batch duplicate report over the whole store: the clusters of customers that share a
+    normalized email or phone (see DuplicateIndex.clusters), how many records could be merged
+    away, the customers that only share a name ("possible") and how many over-common keys
+    were ignored.
+    """
+    index = build_index(repository, fields, max_block_size)
+    clusters = index.clusters()
+    return {
+        "customers": len(index),
+        "clusters": clusters,
+        "duplicates": sum(len(cluster["ids"]) - 1 for cluster in clusters),
+        "possible": index.possible_duplicates(),
+        "skipped_blocks": index.skipped_blocks()
+    }
+
+
+class DedupRepository(RepositoryWrapper):
+    """
+    Checks every save against a DuplicateIndex of the wrapped repository's customers, kept up
+    to date with each write. A customer sharing an email or phone with others under different
+    IDs is logged, or rejected with DuplicateCustomerError when `reject` is True. Sharing
+    only a name is logged as a possible duplicate and never rejected. Reads go to the
+    wrapped repository.
+    """
+
+    def __init__(self, repository: CustomerRepository, reject: bool = False,
+                 fields: Iterable[str] = BLOCKING_FIELDS, max_block_size: int = 20):
+        super().__init__(repository)
+        self.reject = reject
+        self.index = build_index(repository, fields, max_block_size)
+        self._lock = threading.Lock()
+
+    def check(self, customer: Customer) -> Dict[str, List[str]]:
+        """
+        Returns the stored customers sharing a key with `customer`: ID -> fields that matched.
+        Name-only matches are included; is_duplicate tells them apart.
+        """
+        with self._lock:
+            return self.index.matches(customer.to_dict())
+
+    def _admit(self, customer: Customer) -> None:
+        """Checks a customer and, if accepted, indexes it before it is written (so a concurrent save sees it)."""
+        data = customer.to_dict()
+        with self._lock:
+            matches = self.index.matches(data)
+            duplicates = {other_id: fields for other_id, fields in matches.items() if is_duplicate(fields)}
+            if duplicates and self.reject:
+                raise DuplicateCustomerError(customer.customer_id, duplicates)
+            self.index.add(data)
+        if duplicates:
+            log_info(str(DuplicateCustomerError(customer.customer_id, duplicates)))
+        possible = [other_id for other_id in matches if other_id not in duplicates]
+        if possible:
+            log_info(f"Customer '{customer.customer_id}' has the same name as: {', '.join(possible)} "
+                     f"(possible duplicate)")
+
+    def _reindex(self, customer_id: str) -> None:
+        """Puts back the stored version of a customer whose write failed."""
+        stored = self.repository.find_by_id(customer_id)
+        with self._lock:
+            if stored is not None:
+                self.index.add(stored.to_dict())
+            else:
+                self.index.remove(customer_id)
+
+    # --- Repository Interface ---
+    @instrumented('save')
+    def save(self, customer: Customer) -> None:
+        self._admit(customer)
+        try:
+            self.repository.save(customer)
+        except Exception:
+            self._reindex(customer.customer_id)
+            raise
+
+    @instrumented('save_many')
+    def save_many(self, customers: Iterable[Customer], chunk_size: int = 500) -> List[Tuple[Any, Exception]]:
+        """Rejected duplicates are returned as failures with the wrapped repository's own failures."""
+        rejected: List[Tuple[Any, Exception]] = []
+
+        def admitted(items: Iterable[Customer]) -> Iterator[Customer]:
+            for customer in items:
+                try:
+                    self._admit(customer)
+                except DuplicateCustomerError as e:
+                    rejected.append((customer, e))
+                    continue
+                except Exception:
+                    pass  # Not a valid customer: the wrapped repository reports it
+                yield customer
+
+        failures = self.repository.save_many(admitted(customers), chunk_size)
+        for customer, _ in failures:
+            customer_id = getattr(customer, 'customer_id', None)
+            if customer_id is not None:
+                self._reindex(customer_id)
+        return rejected + failures
+
@@ -1,11 +1,32 @@
+import atexit
+import base64
+import bisect
+import functools
+import heapq
 import json
+import operator
 import os
+import re
+import stat
+import sys
+import tempfile
+import threading
+import time
+import weakref
 from abc import ABC, abstractmethod
-from typing import List, Optional
-from core.models import Customer, RegularCustomer, PremiumCustomer, CorporateCustomer
-from utils.exceptions import SCMError
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from core.models import CUSTOMER_TYPES, Customer
+from utils.exceptions import CorruptStorageError, SCMError
+from utils.metrics import instrumented, metrics
 import sqlite3
 
+try:
+    import fcntl
+except ImportError:  # Windows has no flock(); msvcrt byte-range locks are used instead
+    fcntl = None
+    import msvcrt
+
 class CustomerRepository(ABC):
     @abstractmethod
     def save(self, customer: Customer) -> None:
@@ -19,91 +40,1430 @@ class CustomerRepository(ABC):
     def find_by_id(self, customer_id: str) -> Optional[Customer]:
         pass
 
+    @instrumented('find_by_email')
+    def find_by_email(self, email: str) -> List[Customer]:
+        """Finds the customers registered with an email (compared in lower case)."""
+        return self._find_by('email', email.strip().lower())
+
+    @instrumented('find_by_phone')
+    def find_by_phone(self, phone: str) -> List[Customer]:
+        """Finds the customers registered with a phone number."""
+        return self._find_by('phone', phone.strip())
+
+    @instrumented('find_by_type')
+    def find_by_type(self, customer_type: str) -> List[Customer]:
+        """Finds the customers of a type, given by class name (e.g. 'PremiumCustomer')."""
+        return self._find_by('type', customer_type)
+
+    @instrumented('find_by_company')
+    def find_by_company(self, company_name: str) -> List[Customer]:
+        """Finds the corporate customers of a company."""
+        return self._find_by('company_name', company_name)
+
+    def _find_by(self, field: str, value: Any) -> List[Customer]:
+        """Returns the customers whose stored `field` equals `value`. The default scans iter_all()."""
+        return [c for c in self.iter_all() if c.to_dict().get(field) == value]
+
+    def _rehydrate(self, raw_data: list, convert: Callable[[Any], Customer]) -> List[Customer]:
+        """Converts a batch of stored records into customers, timed as the 'rehydrate' operation."""
+        with metrics.timer('rehydrate', type(self).__name__, count=len(raw_data)):
+            return [convert(item) for item in raw_data]
+
+    @instrumented('iter_all')
+    def iter_all(self, batch_size: int = 500) -> Iterator[Customer]:
+        """
+        Yields every customer lazily. Repositories override it to read `batch_size` records
+        at a time; the default simply walks get_all().
+        """
+        yield from self.get_all()
+
+    @instrumented('changes_since')
+    def changes_since(self, token: Optional[int] = None,
+                      limit: Optional[int] = None) -> Tuple[List[Customer], int]:
+        """
+        Returns the customers saved after `token`, oldest change first, and the token to pass
+        next time. Every save stamps the record with the next revision number of the store;
+        the token is the last revision returned. token=None starts from the beginning.
+        `limit` caps the customers returned, except that records stored before revisions existed
+        (JSON files written by older versions) all come with the first, token=None call
+        (sync_changes processes them `batch_size` at a time). The default scans iter_records().
+        """
+        changes, token = select_changes(self.iter_records(), token, limit)
+        return self._rehydrate(changes, customer_from_dict), token
+
+    @instrumented('search')
+    def search(self, text: str, fields: Optional[Iterable[str]] = None, limit: int = 20,
+               offset: int = 0) -> List[Customer]:
+        """
+        Finds the customers whose name, email or company (or only the given `fields`) contain a
+        word starting with each word of `text`, e.g. 'tech' finds 'Tech Corp' and 'TechCorp.com'
+        emails. Results are ranked best first; `offset` and `limit` select the page.
+        """
+        fields = _parse_search_fields(fields)
+        terms = _search_terms(text)
+        if not terms or limit < 1:
+            return []
+        return self._search(terms, fields, limit, offset)
+
+    def _search(self, terms: List[str], fields: Tuple[str, ...], limit: int, offset: int) -> List[Customer]:
+        """Returns one page of search results (see search). The default scores every customer of iter_all()."""
+        return rank_records(((c.to_dict(), c) for c in self.iter_all()), terms, fields, limit, offset)
+
+    def iter_records(self, batch_size: int = 500) -> Iterator[dict]:
+        """
+        Yields every customer as its stored dictionary (the to_dict format) without building
+        Customer objects, for whole-store jobs such as reports. The default walks iter_all().
+        """
+        for customer in self.iter_all(batch_size):
+            yield customer.to_dict()
+
+    @instrumented('query')
+    def query(self, filter: Optional[Dict[str, Any]] = None, order_by: str = 'id', limit: Optional[int] = 100,
+              after: Optional[str] = None) -> Tuple[List[Customer], Optional[str]]:
+        """
+        Returns one page of customers and the cursor of the next page (None on the last page).
+        `filter` maps stored fields to values, e.g. {'type': 'PremiumCustomer'}; a `__gt`,
+        `__gte`, `__lt`, `__lte` or `__in` suffix changes the comparison, e.g.
+        {'loyalty_points__gte': 1000}. `order_by` is a field, prefixed with '-' for descending
+        order; ties are broken by ID. Pass the returned cursor as `after` to get the next page.
+        Missing values sort as '' (or 0 for loyalty_points and seniority).
+        """
+        if limit is not None and limit < 1:
+            raise ValueError('limit must be a positive number or None')
+        conditions = _parse_filter(filter)
+        field, descending = _parse_order(order_by)
+        after_key = _decode_cursor(after, order_by) if after is not None else None
+
+        # Ask for one extra customer to know whether there is a next page
+        customers = self._query(conditions, field, descending, limit + 1 if limit is not None else None, after_key)
+        if limit is None or len(customers) <= limit:
+            return customers, None
+        customers = customers[:limit]
+        return customers, _encode_cursor(order_by, sort_key(customers[-1].to_dict(), field))
+
+    def _query(self, conditions: List[Tuple[str, str, Any]], field: str, descending: bool,
+               limit: Optional[int], after_key: Optional[tuple]) -> List[Customer]:
+        """Returns the customers of a page (see query). The default filters and sorts iter_all()."""
+        return select_records(((c.to_dict(), c) for c in self.iter_all()),
+                               conditions, field, descending, limit, after_key)
+
+    @instrumented('save_many')
+    def save_many(self, customers: Iterable[Customer], chunk_size: int = 500) -> List[Tuple[Any, Exception]]:
+        """
+        Saves many customers and returns the (customer, error) pairs that could not be saved
+        instead of aborting the whole batch. Repositories override it with a batched write path.
+        """
+        failures = []
+        for customer in customers:
+            try:
+                self.save(customer)
+            except Exception as e:
+                failures.append((customer, e))
+        return failures
+
+    def close(self) -> None:
+        """Releases any resources held by the repository. Nothing to do by default."""
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class RepositoryWrapper(CustomerRepository):
+    """
+    Base of the repositories that add behaviour in front of another one (e.g. CachedRepository,
+    DedupRepository). Every method is passed through to the wrapped `repository`; subclasses
+    override only the ones they change.
+    """
+
+    def __init__(self, repository: CustomerRepository):
+        self.repository = repository
+
+    def save(self, customer: Customer) -> None:
+        self.repository.save(customer)
+
+    def save_many(self, customers: Iterable[Customer], chunk_size: int = 500) -> List[Tuple[Any, Exception]]:
+        return self.repository.save_many(customers, chunk_size)
+
+    def find_by_id(self, customer_id: str) -> Optional[Customer]:
+        return self.repository.find_by_id(customer_id)
+
+    def get_all(self) -> List[Customer]:
+        return self.repository.get_all()
+
+    def query(self, filter: Optional[Dict[str, Any]] = None, order_by: str = 'id', limit: Optional[int] = 100,
+              after: Optional[str] = None) -> Tuple[List[Customer], Optional[str]]:
+        return self.repository.query(filter, order_by, limit, after)
+
+    def iter_all(self, batch_size: int = 500) -> Iterator[Customer]:
+        return self.repository.iter_all(batch_size)
+
+    def iter_records(self, batch_size: int = 500) -> Iterator[dict]:
+        return self.repository.iter_records(batch_size)
+
+    def changes_since(self, token: Optional[int] = None,
+                      limit: Optional[int] = None) -> Tuple[List[Customer], int]:
+        return self.repository.changes_since(token, limit)
+
+    def search(self, text: str, fields: Optional[Iterable[str]] = None, limit: int = 20,
+               offset: int = 0) -> List[Customer]:
+        return self.repository.search(text, fields, limit, offset)
+
+    def find_by_email(self, email: str) -> List[Customer]:
+        return self.repository.find_by_email(email)
+
+    def find_by_phone(self, phone: str) -> List[Customer]:
+        return self.repository.find_by_phone(phone)
+
+    def find_by_type(self, customer_type: str) -> List[Customer]:
+        return self.repository.find_by_type(customer_type)
+
+    def find_by_company(self, company_name: str) -> List[Customer]:
+        return self.repository.find_by_company(company_name)
+
+    def close(self) -> None:
+        self.repository.close()
+
+
+def unwrap(repository: CustomerRepository) -> CustomerRepository:
+    """Returns the store behind any number of RepositoryWrappers."""
+    while isinstance(repository, RepositoryWrapper):
+        repository = repository.repository
+    return repository
+
+
+class _SecondaryIndex:
+    """Hash indexes from field values to customer IDs, kept up to date on every save."""
+
+    FIELDS = ('email', 'phone', 'type', 'company_name')
+
+    def __init__(self):
+        # Each value maps to a dict used as an ordered set of IDs
+        self._maps: Dict[str, Dict[Any, Dict[str, None]]] = {field: {} for field in self.FIELDS}
+        self._values: Dict[str, tuple] = {}
+
+    def put(self, data: dict) -> None:
+        """Indexes a record, removing the values of its previous version first."""
+        customer_id = data['id']
+        # Values in FIELDS order. The type is shared by many customers, so keep one string object for it
+        new_values = (data.get('email'), data.get('phone'), sys.intern(data['type']), data.get('company_name'))
+        old_values = self._values.get(customer_id)
+        if old_values == new_values:
+            return
+
+        if old_values is not None:
+            for field, value in zip(self.FIELDS, old_values):
+                if value is not None:
+                    ids = self._maps[field][value]
+                    del ids[customer_id]
+                    if not ids:
+                        del self._maps[field][value]
+        for field, value in zip(self.FIELDS, new_values):
+            if value is not None:
+                self._maps[field].setdefault(value, {})[customer_id] = None
+        self._values[customer_id] = new_values
+
+    def lookup(self, field: str, value: Any) -> List[str]:
+        """Returns the IDs of the records whose `field` equals `value`."""
+        return list(self._maps[field].get(value, ()))
+
+
+# --- Search Helpers ---
+# Searchable fields and their ranking weights (a match in the name counts the most)
+SEARCH_WEIGHTS = {'name': 3.0, 'company_name': 2.0, 'email': 1.0}
+# Runs of letters and digits: the word rule of SQLite's unicode61 tokenizer, so every backend splits alike
+_WORD_PATTERN = re.compile(r'[^\W_]+')
+
+
+def _search_terms(text: str) -> List[str]:
+    """Splits a text into lower-case words. Emails split into their parts ('ana.diaz@x.com' -> ana, diaz, x, com)."""
+    return _WORD_PATTERN.findall(text.lower()) if text else []
+
+
+def _parse_search_fields(fields: Optional[Iterable[str]]) -> Tuple[str, ...]:
+    if fields is None:
+        return tuple(SEARCH_WEIGHTS)
+    fields = tuple(fields)
+    for field in fields:
+        if field not in SEARCH_WEIGHTS:
+            raise ValueError(f'Unknown search field: {field}')
+    return fields
+
+
+def _term_score(field: str, word: str, term: str) -> float:
+    """A whole-word match scores twice a prefix match, times the weight of the field."""
+    return SEARCH_WEIGHTS[field] * (2 if word == term else 1)
+
+
+def _score_record(record: dict, terms: List[str], fields: Tuple[str, ...]) -> Optional[float]:
+    """Scores a record against every term, or returns None if some term matches no word."""
+    words = [(field, _search_terms(record.get(field) or '')) for field in fields]
+    total = 0.0
+    for term in terms:
+        best = max((_term_score(field, word, term) for field, field_words in words
+                    for word in field_words if word.startswith(term)), default=None)
+        if best is None:
+            return None
+        total += best
+    return total
+
+
+def rank_records(pairs: Iterable[Tuple[dict, Any]], terms: List[str], fields: Tuple[str, ...],
+                  limit: int, offset: int) -> list:
+    """Scores (record, payload) pairs and returns the payloads of one page, best first (ties by ID)."""
+    scored = ((score, record['id'], payload) for record, payload in pairs
+              for score in (_score_record(record, terms, fields),) if score is not None)
+    ranked = heapq.nsmallest(offset + limit, scored, key=lambda hit: (-hit[0], hit[1]))
+    return [payload for _, _, payload in ranked[offset:]]
+
+
+class _SearchIndex:
+    """
+    In-memory prefix index for search(): for every searchable field, a sorted vocabulary of
+    words (found by bisection) and the IDs of the records containing each word.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, Dict[str, None]]] = {field: {} for field in SEARCH_WEIGHTS}
+        self._vocabulary: Dict[str, List[str]] = {field: [] for field in SEARCH_WEIGHTS}
+        self._values: Dict[str, tuple] = {}
+
+    def put(self, data: dict) -> None:
+        """Indexes a record, removing the words of its previous version first."""
+        customer_id = data['id']
+        new_values = tuple(data.get(field) for field in SEARCH_WEIGHTS)
+        old_values = self._values.get(customer_id)
+        if old_values == new_values:
+            return
+
+        if old_values is not None:
+            for field, value in zip(SEARCH_WEIGHTS, old_values):
+                for word in set(_search_terms(value)):
+                    ids = self._postings[field][word]
+                    del ids[customer_id]
+                    if not ids:
+                        del self._postings[field][word]
+                        vocabulary = self._vocabulary[field]
+                        del vocabulary[bisect.bisect_left(vocabulary, word)]
+        for field, value in zip(SEARCH_WEIGHTS, new_values):
+            postings = self._postings[field]
+            for word in set(_search_terms(value)):
+                ids = postings.get(word)
+                if ids is None:
+                    ids = postings[word] = {}
+                    bisect.insort(self._vocabulary[field], word)
+                ids[customer_id] = None
+        self._values[customer_id] = new_values
+
+    def search(self, terms: List[str], fields: Tuple[str, ...], limit: int, offset: int) -> List[str]:
+        """Returns the IDs of one page of results, ranked like rank_records."""
+        scores: Optional[Dict[str, float]] = None
+        for term in terms:
+            best: Dict[str, float] = {}
+            for field in fields:
+                vocabulary = self._vocabulary[field]
+                # Every word starting with `term` sits in one contiguous range of the sorted vocabulary
+                i = bisect.bisect_left(vocabulary, term)
+                while i < len(vocabulary) and vocabulary[i].startswith(term):
+                    word = vocabulary[i]
+                    i += 1
+                    score = _term_score(field, word, term)
+                    for customer_id in self._postings[field][word]:
+                        if best.get(customer_id, 0) < score:
+                            best[customer_id] = score
+            if scores is None:
+                scores = best
+            else:
+                scores = {customer_id: total + best[customer_id]
+                          for customer_id, total in scores.items() if customer_id in best}
+            if not scores:
+                return []
+        ranked = heapq.nsmallest(offset + limit, scores.items(), key=lambda hit: (-hit[1], hit[0]))
+        return [customer_id for customer_id, _ in ranked[offset:]]
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """Splits an iterable into lists of at most `size` items without materializing it."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _to_dicts(customers: Iterable[Customer], failures: list) -> List[dict]:
+    """Converts customers to dictionaries, recording the ones that fail in `failures`."""
+    records = []
+    for customer in customers:
+        try:
+            records.append(customer.to_dict())
+        except Exception as e:
+            failures.append((customer, e))
+    return records
+
+
+def iter_json_array(file_path: str, read_size: int = 1 << 16,
+                     on_read: Optional[Callable[[int], None]] = None) -> Iterator[Any]:
+    """
+    Yields the items of a top-level JSON array one at a time, reading the file in blocks
+    of `read_size` characters instead of loading the whole document.
+    `on_read` is called with the size of every block read, e.g. to report progress.
+    Malformed input raises JSONDecodeError like json.loads would, including a trailing comma
+    and anything but whitespace after the closing bracket.
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        pos = 0
+        eof = False
+
+        def read() -> str:
+            block = f.read(read_size)
+            if on_read is not None and block:
+                on_read(len(block))
+            return block
+
+        def skip_whitespace() -> bool:
+            """Moves `pos` to the next significant character. Returns False at end of file."""
+            nonlocal buffer, pos, eof
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                    pos += 1
+                if pos < len(buffer):
+                    return True
+                if eof:
+                    return False
+                buffer, pos = read(), 0
+                eof = not buffer
+
+        if not skip_whitespace():
+            return
+        if buffer[pos] != '[':
+            raise json.JSONDecodeError('Expected a JSON array', buffer, pos)
+        pos += 1
+
+        expect_item = True
+        after_comma = False
+        while True:
+            if not skip_whitespace():
+                raise json.JSONDecodeError('Unterminated JSON array', buffer, pos)
+            char = buffer[pos]
+            if char == ']':
+                if expect_item and after_comma:
+                    raise json.JSONDecodeError('Expecting value', buffer, pos)
+                pos += 1
+                if skip_whitespace():
+                    raise json.JSONDecodeError('Extra data', buffer, pos)
+                return
+            if not expect_item:
+                if char != ',':
+                    raise json.JSONDecodeError("Expected ',' or ']'", buffer, pos)
+                pos += 1
+                expect_item = after_comma = True
+                continue
+
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                    # A value is complete once a delimiter follows it; otherwise it may be a
+                    # number cut at the block boundary (e.g. '1.' + '5') and needs more input
+                    if eof or (end < len(buffer) and buffer[end] in ' \t\r\n,]'):
+                        break
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                more = read()
+                eof = not more
+                buffer, pos = buffer[pos:] + more, 0
+            yield item
+            pos = end
+            expect_item = False
+
+
+def fsync_directory(directory: str) -> None:
+    """Forces a rename in `directory` to disk. Not possible (nor needed) on Windows."""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def customer_from_dict(item: dict, verify: bool = False) -> Customer:
+    """Factory method to convert a stored dictionary back into a specific Customer object."""
+    customer_class = CUSTOMER_TYPES.get(item.get('type'))
+    if customer_class is None:
+        raise ValueError(f"Unknown customer type: {item.get('type')}")
+    return customer_class.from_row(item, verify)
+
+
+def select_changes(records: Iterable[dict], token: Optional[int], limit: Optional[int]) -> Tuple[List[dict], int]:
+    """changes_since() over raw records: the ones with a revision above `token`, in revision order."""
+    unstamped, changes = [], []
+    for item in records:
+        revision = item.get('revision')
+        if revision is None:
+            # Records written before change tracking can't be paged by revision: return them all at once
+            if token is None:
+                unstamped.append(item)
+        elif revision > (token or 0):
+            changes.append(item)
+    changes.sort(key=operator.itemgetter('revision'))
+    if limit is not None:
+        changes = changes[:limit]
+    return unstamped + changes, changes[-1]['revision'] if changes else (token or 0)
+
+
+# --- Query Helpers ---
+# Fields accepted by query() filters and order_by, and the value missing ones sort as
+QUERY_FIELDS = ('id', 'name', 'email', 'phone', 'type', 'loyalty_points', 'company_name', 'tax_id', 'position',
+                'seniority')
+_NUMERIC_FIELDS = ('loyalty_points', 'seniority')
+_SORT_DEFAULTS = {field: 0 if field in _NUMERIC_FIELDS else '' for field in QUERY_FIELDS}
+
+_COMPARISONS = {
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+}
+
+
+def _parse_filter(filter: Optional[Dict[str, Any]]) -> List[Tuple[str, str, Any]]:
+    """Splits query() filter keys into (field, operator, value) conditions, rejecting unknown ones."""
+    conditions = []
+    for key, value in (filter or {}).items():
+        field, _, op = key.partition('__')
+        if field not in QUERY_FIELDS:
+            raise ValueError(f'Unknown query field: {field}')
+        if op and op != 'in' and op not in _COMPARISONS:
+            raise ValueError(f'Unknown query operator: {op}')
+        if op in _COMPARISONS and value is None:
+            raise ValueError(f'Cannot compare {field} with None')
+        if op == 'in':
+            value = tuple(value)
+        conditions.append((field, op, value))
+    return conditions
+
+
+def _parse_order(order_by: str) -> Tuple[str, bool]:
+    """Returns the field and direction (True for descending) of a query() order_by."""
+    field = order_by[1:] if order_by.startswith('-') else order_by
+    if field not in QUERY_FIELDS:
+        raise ValueError(f'Unknown query field: {field}')
+    return field, order_by.startswith('-')
+
+
+def sort_key(record: dict, field: str) -> tuple:
+    """Keyset position of a record: its sort value (missing values replaced) and its ID."""
+    value = record.get(field)
+    return (_SORT_DEFAULTS[field] if value is None else value, record['id'])
+
+
+def _encode_cursor(order_by: str, key: tuple) -> str:
+    """Opaque, URL-safe cursor pointing right after `key` in the `order_by` ordering."""
+    return base64.urlsafe_b64encode(json.dumps([order_by, *key]).encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor: str, order_by: str) -> tuple:
+    try:
+        cursor_order, value, customer_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        raise ValueError(f'Invalid cursor: {cursor}')
+    if cursor_order != order_by:
+        raise ValueError(f"Cursor was created for order_by='{cursor_order}', not '{order_by}'")
+    return value, customer_id
+
+
+def _matches(record: dict, conditions: List[Tuple[str, str, Any]]) -> bool:
+    """Evaluates query() conditions on a stored record. Comparisons never match missing values, as in SQL."""
+    for field, op, value in conditions:
+        actual = record.get(field)
+        if not op:
+            if actual != value:
+                return False
+        elif op == 'in':
+            if actual not in value:
+                return False
+        elif actual is None or not _COMPARISONS[op](actual, value):
+            return False
+    return True
+
+
+def select_records(pairs: Iterable[Tuple[dict, Any]], conditions: List[Tuple[str, str, Any]], field: str,
+                    descending: bool, limit: Optional[int], after_key: Optional[tuple]) -> list:
+    """
+    Runs a query() page over (record, payload) pairs and returns the payloads in page order.
+    Only `limit` candidates are kept while scanning (a heap), instead of sorting everything.
+    """
+    candidates = ((sort_key(record, field), payload) for record, payload in pairs if _matches(record, conditions))
+    if after_key is not None:
+        if descending:
+            candidates = (candidate for candidate in candidates if candidate[0] < after_key)
+        else:
+            candidates = (candidate for candidate in candidates if candidate[0] > after_key)
+
+    # Keys end with the unique ID, so payloads are never compared
+    if limit is None:
+        ordered = sorted(candidates, key=operator.itemgetter(0), reverse=descending)
+    elif descending:
+        ordered = heapq.nlargest(limit, candidates, key=operator.itemgetter(0))
+    else:
+        ordered = heapq.nsmallest(limit, candidates, key=operator.itemgetter(0))
+    return [payload for _, payload in ordered]
+
+
+class _FileLock:
+    """
+    Exclusive lock shared by every thread and process writing the same data file. It is held
+    on a `<file>.lock` sidecar, since the data file itself is replaced on every write. Each
+    acquisition opens its own handle: flock() locks on different handles exclude each other
+    even within one process, so threads are serialized too.
+    """
+
+    def __init__(self, path: str, component: str):
+        self.path = path
+        self.component = component
+
+    @contextmanager
+    def acquire(self) -> Iterator[None]:
+        with open(self.path, 'a+b') as f:
+            with metrics.timer('lock_wait', self.component):
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                else:
+                    f.seek(0)
+                    while True:
+                        try:
+                            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            continue  # LK_LOCK gives up after 10 seconds; keep waiting
+            try:
+                yield
+            finally:
+                # Closing the handle releases a flock(); msvcrt locks must be released explicitly
+                if fcntl is None:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _flush_at_exit(ref: weakref.ref) -> None:
+    """atexit hook of buffered JSONRepository: writes the saves still pending."""
+    repository = ref()
+    if repository is not None:
+        repository.flush()
+
+
 class JSONRepository(CustomerRepository):
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, buffered: bool = False, flush_threshold: int = 1000,
+                 flush_interval: Optional[float] = None, verify: bool = False, fsync: bool = True):
+        """
+        By default every call goes straight to the file.
+        With buffered=True the file is loaded once into an ID-keyed index: reads and saves
+        are served from memory and pending changes are written back in batches, either on
+        flush(), when leaving a `with` block, after `flush_threshold` saves, `flush_interval`
+        seconds after the last flush (a background timer, so idle stores are flushed too) and
+        at interpreter exit.
+        With verify=True every loaded record is validated again (see Customer.from_row).
+        Several processes can share the file: writes are serialized by a lock on
+        `<file>.lock` and replace the file atomically, so reads need no lock. A buffered
+        flush merges the saves other processes made since this one last read the file.
+        fsync=False skips forcing each write to disk (faster, but a power loss can lose it).
+        """
         self.file_path = file_path
+        self.verify = verify
+        self.buffered = buffered
+        self.flush_threshold = flush_threshold
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._file_lock = _FileLock(file_path + '.lock', type(self).__name__)
+        # Guards the in-memory indexes of buffered mode: saves and index reads take it, flushes
+        # only to copy the index and to update it, never while they read or write the file
+        self._lock = threading.RLock()
+        # Serializes flushes (merge and file write), so readers never wait for one
+        self._flush_lock = threading.Lock()
+        # (inode, size, mtime) of the file as last read or written (buffered mode)
+        self._file_signature: Optional[tuple] = None
+        # IDs saved since the last flush, in save order (buffered mode)
+        self._dirty: Dict[str, None] = {}
+        self._index: Dict[str, dict] = {}
+        self._secondary = _SecondaryIndex()
+        # Built on the first search (buffered mode), then kept up to date by every save
+        self._search_index: Optional[_SearchIndex] = None
+        # Last revision stamped on a record (buffered mode; otherwise read from the file on every save)
+        self._revision = 0
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        # Background flush of buffered mode, started by the first save after a flush when flush_interval is set
+        self._flush_timer: Optional[threading.Timer] = None
+        # Weak, so a forgotten repository can still be garbage collected; close() unregisters it
+        self._exit_flush = functools.partial(_flush_at_exit, weakref.ref(self))
+        if self.buffered:
+            atexit.register(self._exit_flush)
         # Ensure the file exists when initializing
         if not os.path.exists(self.file_path):
-            self._write_to_file([])
+            with self._file_lock.acquire():
+                if not os.path.exists(self.file_path):
+                    self._write_to_file([])
+        if self.buffered:
+            # Dicts keep insertion order, so the file order is preserved on flush
+            signature = self._stat_file()
+            for item in self._read_file():
+                self._index_loaded(item)
+            self._file_signature = signature
+
+    def _index_loaded(self, item: dict) -> None:
+        """Adds a record read from the file to the buffered indexes."""
+        # Every parsed record gets its own copy of the type string; keep a single one
+        item['type'] = sys.intern(item['type'])
+        self._index[item['id']] = item
+        self._secondary.put(item)
+        if self._search_index is not None:
+            self._search_index.put(item)
+        self._revision = max(self._revision, item.get('revision') or 0)
+
+    def _stat_file(self) -> Optional[tuple]:
+        try:
+            st = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
 
     def _read_file(self) -> list:
-        """Helper to read the raw list from JSON file."""
+        """
+        Helper to read the raw list from JSON file. File I/O and JSON parsing are timed separately.
+        No lock is needed: writers replace the file atomically, so the open handle always
+        sees one complete version. An unreadable file raises CorruptStorageError.
+        """
+        component = type(self).__name__
         try:
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
+            with metrics.timer('storage_read', component):
+                with open(self.file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+        except FileNotFoundError:
+            return []
+        if not content.strip():
             return []
+        with metrics.timer('parse', component):
+            try:
+                data = json.loads(content)
+            except json.JSONDecodeError as e:
+                raise CorruptStorageError(self.file_path, e) from e
+        if not isinstance(data, list):
+            raise CorruptStorageError(self.file_path, 'expected a JSON array')
+        return data
+
+    def _iter_file(self) -> Iterator[dict]:
+        """Parses the file incrementally (see iter_json_array), without locking, like _read_file."""
+        try:
+            yield from iter_json_array(self.file_path)
+        except FileNotFoundError:
+            return
+        except json.JSONDecodeError as e:
+            raise CorruptStorageError(self.file_path, e) from e
+
+    def _from_raw(self, item: dict) -> Customer:
+        return customer_from_dict(item, self.verify)
 
     def _write_to_file(self, data: list) -> None:
-        """Helper to write a list to the JSON file."""
-        with open(self.file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4)
+        """
+        Helper to write a list to the JSON file. Buffered mode uses compact separators.
+        The data goes to a temporary file that then replaces the original, so concurrent
+        readers see either the old or the new content, never a half-written file. With fsync
+        the new content, then the rename, are on disk before this returns, so a crash leaves
+        one version or the other. Callers hold the file lock.
+        """
+        component = type(self).__name__
+        with metrics.timer('serialize', component):
+            if self.buffered:
+                # Encoded a thousand records at a time: one json.dumps of a large index holds the
+                # GIL until it returns, which would stall the lookups a flush must not block
+                content = '[' + ','.join(json.dumps(chunk, separators=(',', ':'))[1:-1]
+                                         for chunk in chunked(data, 1000)) + ']'
+            else:
+                content = json.dumps(data, indent=4)
 
+        with metrics.timer('storage_write', component):
+            directory = os.path.dirname(os.path.abspath(self.file_path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                    if self.fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+                # mkstemp creates private files: keep the permissions of the file being replaced
+                mode = stat.S_IMODE(os.stat(self.file_path).st_mode) if os.path.exists(self.file_path) else 0o644
+                os.chmod(tmp_path, mode)
+                os.replace(tmp_path, self.file_path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            if self.fsync:
+                fsync_directory(directory)
+
+    @instrumented('save')
     def save(self, customer: Customer) -> None:
         """Saves a customer. If ID exists, it updates it."""
-        customers_data = self._read_file()
-        
+        if self.buffered:
+            data = customer.to_dict()
+            with self._lock:
+                self._revision += 1
+                data['revision'] = self._revision
+                self._index[data['id']] = data
+                self._secondary.put(data)
+                if self._search_index is not None:
+                    self._search_index.put(data)
+                self._dirty[data['id']] = None
+                self._pending += 1
+                due = self._flush_due()
+            if due:
+                self.flush()
+            return
+
         # Convert the object to a dictionary
         new_data = customer.to_dict()
-        
-        # Search if it already exists to update it or add it
-        found = False
-        for i, c in enumerate(customers_data):
-            if c['id'] == customer.customer_id:
-                customers_data[i] = new_data
-                found = True
-                break
-        
-        # If it doesn't exist in the file, add it
-        if not found:
-            customers_data.append(new_data)
-            
-        self._write_to_file(customers_data)
 
+        # The whole read-modify-write holds the lock, so a concurrent save can't be lost
+        with self._file_lock.acquire():
+            customers_data = self._read_file()
+
+            # Stamped with the next revision of the file
+            new_data['revision'] = max((c.get('revision') or 0 for c in customers_data), default=0) + 1
+
+            # Search if it already exists to update it or add it
+            found = False
+            for i, c in enumerate(customers_data):
+                if c['id'] == customer.customer_id:
+                    customers_data[i] = new_data
+                    found = True
+                    break
+
+            # If it doesn't exist in the file, add it
+            if not found:
+                customers_data.append(new_data)
+
+            self._write_to_file(customers_data)
+
+    @instrumented('save_many')
+    def save_many(self, customers: Iterable[Customer], chunk_size: int = 500) -> List[Tuple[Any, Exception]]:
+        """Saves many customers with a single read-merge-write of the file (or of the index when buffered)."""
+        failures = []
+        if self.buffered:
+            for chunk in chunked(customers, chunk_size):
+                records = _to_dicts(chunk, failures)
+                with self._lock:
+                    for data in records:
+                        self._revision += 1
+                        data['revision'] = self._revision
+                        self._index[data['id']] = data
+                        self._secondary.put(data)
+                        if self._search_index is not None:
+                            self._search_index.put(data)
+                        self._dirty[data['id']] = None
+                        self._pending += 1
+            # A single flush check for the whole batch, so a large batch is written once
+            with self._lock:
+                due = self._flush_due()
+            if due:
+                self.flush()
+            return failures
+
+        new_records = _to_dicts(customers, failures)
+        if not new_records:
+            return failures
+
+        with self._file_lock.acquire():
+            customers_data = self._read_file()
+            positions = {c['id']: i for i, c in enumerate(customers_data)}
+            revision = max((c.get('revision') or 0 for c in customers_data), default=0)
+            for data in new_records:
+                revision += 1
+                data['revision'] = revision
+                i = positions.get(data['id'])
+                if i is None:
+                    positions[data['id']] = len(customers_data)
+                    customers_data.append(data)
+                else:
+                    customers_data[i] = data
+            self._write_to_file(customers_data)
+        return failures
+
+    def _flush_due(self) -> bool:
+        """
+        Whether the pending saves or the time since the last flush cross a threshold; if not,
+        makes sure a timer will flush once `flush_interval` has passed. Lock must be held, and
+        released before flushing.
+        """
+        if self.flush_threshold and self._pending >= self.flush_threshold:
+            return True
+        if self.flush_interval is not None:
+            remaining = self.flush_interval - (time.monotonic() - self._last_flush)
+            if remaining <= 0:
+                return True
+            if self._pending and self._flush_timer is None:
+                self._flush_timer = threading.Timer(remaining, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        return False
+
+    @instrumented('flush')
+    def flush(self) -> None:
+        """
+        Writes the in-memory index back to the file if there are pending saves. If another
+        process wrote the file since this one last read it, its changes are merged first.
+        The index is only locked to copy it and to update it, so lookups and saves carry on
+        while the file is written; saves made meanwhile stay pending for the next flush.
+        """
+        if not self.buffered:
+            return
+        with self._flush_lock:
+            with self._lock:
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+                if not self._dirty:
+                    return
+            with self._file_lock.acquire():
+                if self._stat_file() != self._file_signature:
+                    items = self._read_file()
+                    with self._lock:
+                        self._merge_file(items)
+                with self._lock:
+                    flushed = {customer_id: self._index[customer_id] for customer_id in self._dirty}
+                    records = list(self._index.values())
+                self._write_to_file(records)
+                self._file_signature = self._stat_file()
+            with self._lock:
+                # A customer saved again during the write has a new record: it stays pending
+                for customer_id, data in flushed.items():
+                    if self._index.get(customer_id) is data:
+                        del self._dirty[customer_id]
+                self._pending = len(self._dirty)
+                self._last_flush = time.monotonic()
+
+    def _merge_file(self, items: List[dict]) -> None:
+        """
+        Merges the records other processes wrote (`items`, read from the file), keeping this
+        process's unflushed saves on top (last flush wins for a customer saved on both sides).
+        The unflushed saves are then stamped again after the file's last revision, so
+        revisions keep following write order. Lock must be held.
+        """
+        pending = {customer_id: self._index[customer_id] for customer_id in self._dirty}
+        known = self._index
+        self._index = {}
+        self._revision = 0
+        for item in items:
+            if item['id'] in pending:
+                self._index[item['id']] = pending[item['id']]
+            elif known.get(item['id']) != item:
+                self._index_loaded(item)
+            else:
+                self._index[item['id']] = known[item['id']]
+                self._revision = max(self._revision, item.get('revision') or 0)
+        for customer_id, data in known.items():
+            self._index.setdefault(customer_id, data)
+        for data in pending.values():
+            self._revision += 1
+            data['revision'] = self._revision
+
+    def close(self) -> None:
+        """Flushes any pending saves and stops the background flushes."""
+        self.flush()
+        atexit.unregister(self._exit_flush)
+
+    @instrumented('get_all')
     def get_all(self) -> List[Customer]:
         """Reads JSON and converts dictionaries back to Customer objects."""
-        raw_data = self._read_file()
-        customers = []
-        
-        for item in raw_data:
-            # Factory method to convert JSON dictionaries back into specific Customer objects
-            c_type = item.get('type')
-            if c_type == 'RegularCustomer':
-                obj = RegularCustomer(item['id'], item['name'], item['email'], item['phone'])
-            elif c_type == 'PremiumCustomer':
-                obj = PremiumCustomer(item['id'], item['name'], item['email'], item['phone'], item.get('loyalty_points', 0))
-            elif c_type == 'CorporateCustomer':
-                obj = CorporateCustomer(item['id'], item['name'], item['email'], item['phone'], 
-                                        item['company_name'], item['tax_id'], item['position'])
-            else:
-                raise ValueError(f'Unknown customer type: {c_type}')
-            
-            # Add the object to the list of customers
-            customers.append(obj)
-            
-        return customers
+        # Buffered reads take a snapshot of the index so concurrent saves don't break the iteration
+        raw_data = self._snapshot() if self.buffered else self._read_file()
+        return self._rehydrate(raw_data, self._from_raw)
 
+    @instrumented('iter_all')
+    def iter_all(self, batch_size: int = 500) -> Iterator[Customer]:
+        """Yields customers while the file is parsed incrementally, keeping memory flat."""
+        # Buffered mode iterates over a snapshot of the index so saves during the iteration don't break it
+        raw_data = self._snapshot() if self.buffered else self._iter_file()
+        for chunk in chunked(raw_data, batch_size):
+            yield from self._rehydrate(chunk, self._from_raw)
+
+    @instrumented('find_by_id')
     def find_by_id(self, customer_id: str) -> Optional[Customer]:
-        """Finds a specific customer by ID."""
-        all_customers = self.get_all()
-        for c in all_customers:
-            if c.customer_id == customer_id:
-                return c
-        return None
+        """Finds a specific customer by ID. Only the matching record is rehydrated."""
+        if self.buffered:
+            item = self._index.get(customer_id)
+        else:
+            item = next((item for item in self._read_file() if item['id'] == customer_id), None)
+        return self._rehydrate([item], self._from_raw)[0] if item is not None else None
+
+    def _find_by(self, field: str, value: Any) -> List[Customer]:
+        """Uses the in-memory hash indexes when buffered, otherwise scans the raw records."""
+        if self.buffered:
+            with self._lock:
+                raw_data = [self._index[customer_id] for customer_id in self._secondary.lookup(field, value)]
+        else:
+            raw_data = [item for item in self._read_file() if item.get(field) == value]
+        return self._rehydrate(raw_data, self._from_raw)
+
+    def _search(self, terms: List[str], fields: Tuple[str, ...], limit: int, offset: int) -> List[Customer]:
+        """Uses the in-memory prefix index when buffered, otherwise scores the streamed raw records."""
+        if not self.buffered:
+            page = rank_records(((item, item) for item in self.iter_records()), terms, fields, limit, offset)
+            return self._rehydrate(page, self._from_raw)
+
+        with self._lock:
+            if self._search_index is None:
+                self._search_index = _SearchIndex()
+                for item in self._index.values():
+                    self._search_index.put(item)
+            ids = self._search_index.search(terms, fields, limit, offset)
+            raw_data = [self._index[customer_id] for customer_id in ids]
+        return self._rehydrate(raw_data, self._from_raw)
+
+    @instrumented('changes_since')
+    def changes_since(self, token: Optional[int] = None,
+                      limit: Optional[int] = None) -> Tuple[List[Customer], int]:
+        """Selects the changed raw records (index snapshot or streamed file) and rehydrates only those."""
+        changes, token = select_changes(self.iter_records(), token, limit)
+        return self._rehydrate(changes, self._from_raw), token
+
+    def iter_records(self, batch_size: int = 500) -> Iterator[dict]:
+        """Yields the raw records of a snapshot of the index, or of the file parsed incrementally."""
+        if self.buffered:
+            yield from self._snapshot()
+            return
+        yield from self._iter_file()
+
+    def _snapshot(self) -> List[dict]:
+        """The buffered records at this moment, safe to iterate while saves go on."""
+        with self._lock:
+            return list(self._index.values())
+
+    def _query(self, conditions: List[Tuple[str, str, Any]], field: str, descending: bool,
+               limit: Optional[int], after_key: Optional[tuple]) -> List[Customer]:
+        """Filters and sorts the raw records and rehydrates only the page."""
+        page = select_records(((item, item) for item in self.iter_records()), conditions, field, descending,
+                               limit, after_key)
+        return self._rehydrate(page, self._from_raw)
+
+
+class JSONLinesRepository(CustomerRepository):
+    def __init__(self, file_path: str, compaction_ratio: float = 0.5, min_compaction_records: int = 1000,
+                 background_compaction: bool = True, fsync: bool = False, verify: bool = False):
+        """
+        Append-only JSON Lines storage: every save appends one record to the log and the
+        latest record for a customer_id wins.
+        The log is compacted on compact() or automatically once the share of superseded
+        records reaches `compaction_ratio` (and the log holds at least `min_compaction_records`).
+        Set fsync=True to force every append to disk before save returns, and verify=True to
+        validate every loaded record again.
+        """
+        self.file_path = file_path
+        self.verify = verify
+        self.compaction_ratio = compaction_ratio
+        self.min_compaction_records = min_compaction_records
+        self.background_compaction = background_compaction
+        self.fsync = fsync
+        self._lock = threading.RLock()
+        self._compaction_lock = threading.Lock()
+        self._compactor: Optional[threading.Thread] = None
+        self._offsets: Dict[str, int] = {}
+        self._secondary = _SecondaryIndex()
+        # Built on the first search, then kept up to date by every save
+        self._search_index: Optional[_SearchIndex] = None
+        self._record_count = 0
+        self._size = 0
+        # Last revision stamped on a record; the log is in revision order
+        self._revision = 0
+        self._load()
+        self._open_handles()
+
+    def _load(self) -> None:
+        """Rebuilds the last-write-wins offset index and drops a torn record at the end of the log."""
+        if not os.path.exists(self.file_path):
+            open(self.file_path, 'wb').close()
+
+        offset = 0
+        with open(self.file_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # A crash in the middle of an append leaves an incomplete last line
+                    break
+                record = self._parse_record(line)
+                if record is not None:
+                    self._offsets[record['id']] = offset
+                    self._secondary.put(record)
+                    self._record_count += 1
+                    self._revision = max(self._revision, record.get('revision') or 0)
+                offset += len(line)
+
+        if offset < os.path.getsize(self.file_path):
+            with open(self.file_path, 'r+b') as f:
+                f.truncate(offset)
+        self._size = offset
+
+    @staticmethod
+    def _parse_record(line: bytes) -> Optional[dict]:
+        """Parses a log line, returning None if it is not a valid record."""
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            return None
+        return record if isinstance(record, dict) and 'id' in record else None
+
+    @classmethod
+    def _parse_id(cls, line: bytes) -> Optional[str]:
+        """Returns the ID of a log line, or None if the line is not a valid record."""
+        record = cls._parse_record(line)
+        return record['id'] if record is not None else None
+
+    def _open_handles(self) -> None:
+        self._writer = open(self.file_path, 'ab')
+        self._reader = open(self.file_path, 'rb')
+
+    def _close_handles(self) -> None:
+        self._writer.close()
+        self._reader.close()
+
+    def _read_record(self, offset: int) -> dict:
+        """Reads the record stored at the given offset. Must be called with the lock held."""
+        self._reader.seek(offset)
+        return json.loads(self._reader.readline())
+
+    def _from_raw(self, item: dict) -> Customer:
+        return customer_from_dict(item, self.verify)
+
+    def garbage_ratio(self) -> float:
+        """Share of records in the log that have been superseded by a later save."""
+        with self._lock:
+            if not self._record_count:
+                return 0.0
+            return 1 - len(self._offsets) / self._record_count
+
+    @instrumented('save')
+    def save(self, customer: Customer) -> None:
+        """Appends the customer to the log. A later record for the same ID supersedes earlier ones."""
+        data = customer.to_dict()
+        with self._lock:
+            # Revisions are stamped under the lock so they are appended in order
+            self._revision += 1
+            data['revision'] = self._revision
+            line = (json.dumps(data, separators=(',', ':')) + '\n').encode('utf-8')
+            self._writer.write(line)
+            self._writer.flush()
+            if self.fsync:
+                os.fsync(self._writer.fileno())
+            self._offsets[data['id']] = self._size
+            self._secondary.put(data)
+            if self._search_index is not None:
+                self._search_index.put(data)
+            self._size += len(line)
+            self._record_count += 1
+        self._maybe_compact()
+
+    @instrumented('save_many')
+    def save_many(self, customers: Iterable[Customer], chunk_size: int = 500) -> List[Tuple[Any, Exception]]:
+        """Appends many customers, writing each chunk with a single write call."""
+        failures = []
+        for chunk in chunked(customers, chunk_size):
+            records = _to_dicts(chunk, failures)
+            if not records:
+                continue
+            with self._lock:
+                for data in records:
+                    self._revision += 1
+                    data['revision'] = self._revision
+                lines = [(json.dumps(data, separators=(',', ':')) + '\n').encode('utf-8') for data in records]
+                self._writer.write(b''.join(lines))
+                self._writer.flush()
+                if self.fsync:
+                    os.fsync(self._writer.fileno())
+                for data, line in zip(records, lines):
+                    self._offsets[data['id']] = self._size
+                    self._secondary.put(data)
+                    if self._search_index is not None:
+                        self._search_index.put(data)
+                    self._size += len(line)
+                self._record_count += len(lines)
+            self._maybe_compact()
+        return failures
+
+    def _maybe_compact(self) -> None:
+        """Starts a compaction when the garbage ratio threshold is crossed."""
+        if self._record_count < self.min_compaction_records or self.garbage_ratio() < self.compaction_ratio:
+            return
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        if self.background_compaction:
+            self._compactor = threading.Thread(target=self.compact, daemon=True)
+            self._compactor.start()
+        else:
+            self.compact()
+
+    @instrumented('compact')
+    def compact(self) -> None:
+        """
+        Rewrites the log keeping only the latest record of each customer.
+        Live records are copied without blocking saves; records appended meanwhile are copied
+        under the lock at the end, and the new log replaces the old one with an atomic rename.
+        """
+        with self._compaction_lock:
+            with self._lock:
+                live = sorted(self._offsets.items(), key=lambda item: item[1])
+                copied_until = self._size
+
+            tmp_path = self.file_path + '.compact'
+            new_offsets: Dict[str, int] = {}
+            position = 0
+            record_count = 0
+            with open(self.file_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                for customer_id, offset in live:
+                    src.seek(offset)
+                    line = src.readline()
+                    dst.write(line)
+                    new_offsets[customer_id] = position
+                    position += len(line)
+                    record_count += 1
+
+                with self._lock:
+                    # Copy whatever was appended while the live records were being copied
+                    src.seek(copied_until)
+                    for line in src:
+                        customer_id = self._parse_id(line)
+                        if customer_id is None:
+                            continue
+                        dst.write(line)
+                        new_offsets[customer_id] = position
+                        position += len(line)
+                        record_count += 1
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                    dst.close()
+
+                    self._close_handles()
+                    os.replace(tmp_path, self.file_path)
+                    self._offsets = new_offsets
+                    self._size = position
+                    self._record_count = record_count
+                    self._open_handles()
+
+    def close(self) -> None:
+        """Waits for a running compaction and closes the log file."""
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            self._close_handles()
+
+    @instrumented('get_all')
+    def get_all(self) -> List[Customer]:
+        """Reads the live records in log order and rehydrates them."""
+        with self._lock, metrics.timer('storage_read', type(self).__name__):
+            offsets = sorted(self._offsets.values())
+            raw_data = [self._read_record(offset) for offset in offsets]
+        return self._rehydrate(raw_data, self._from_raw)
+
+    def _iter_raw_chunks(self, batch_size: int) -> Iterator[List[dict]]:
+        """
+        Yields the live raw records in log order, `batch_size` at a time. The log is read through
+        its own handle, which keeps pointing at the snapshotted file even if a compaction replaces it.
+        """
+        with self._lock:
+            offsets = sorted(self._offsets.values())
+            f = open(self.file_path, 'rb')
+        with f:
+            for chunk in chunked(offsets, batch_size):
+                raw_data = []
+                with metrics.timer('storage_read', type(self).__name__):
+                    for offset in chunk:
+                        f.seek(offset)
+                        raw_data.append(json.loads(f.readline()))
+                yield raw_data
+
+    @instrumented('iter_all')
+    def iter_all(self, batch_size: int = 500) -> Iterator[Customer]:
+        """Yields the live records in log order, rehydrating one batch at a time."""
+        for raw_data in self._iter_raw_chunks(batch_size):
+            yield from self._rehydrate(raw_data, self._from_raw)
+
+    @instrumented('find_by_id')
+    def find_by_id(self, customer_id: str) -> Optional[Customer]:
+        """Reads only the latest record of the customer using the offset index."""
+        with self._lock:
+            offset = self._offsets.get(customer_id)
+            if offset is None:
+                return None
+            item = self._read_record(offset)
+        return self._rehydrate([item], self._from_raw)[0]
+
+    def _find_by(self, field: str, value: Any) -> List[Customer]:
+        """Looks the IDs up in the in-memory hash indexes and reads only those records."""
+        with self._lock:
+            raw_data = [self._read_record(self._offsets[customer_id])
+                        for customer_id in self._secondary.lookup(field, value)]
+        return self._rehydrate(raw_data, self._from_raw)
+
+    def _search(self, terms: List[str], fields: Tuple[str, ...], limit: int, offset: int) -> List[Customer]:
+        """Looks the words up in the in-memory prefix index and reads only the records of the page."""
+        with self._lock:
+            if self._search_index is None:
+                # Built under the lock so no save is missed while the log is read
+                index = _SearchIndex()
+                for item in self.iter_records():
+                    index.put(item)
+                self._search_index = index
+            ids = self._search_index.search(terms, fields, limit, offset)
+            raw_data = [self._read_record(self._offsets[customer_id]) for customer_id in ids]
+        return self._rehydrate(raw_data, self._from_raw)
+
+    @instrumented('changes_since')
+    def changes_since(self, token: Optional[int] = None,
+                      limit: Optional[int] = None) -> Tuple[List[Customer], int]:
+        """Selects the changed live records from the log and rehydrates only those."""
+        changes, token = select_changes(self.iter_records(), token, limit)
+        return self._rehydrate(changes, self._from_raw), token
+
+    def iter_records(self, batch_size: int = 500) -> Iterator[dict]:
+        """Yields the live raw records in log order."""
+        for raw_data in self._iter_raw_chunks(batch_size):
+            yield from raw_data
+
+    def _query(self, conditions: List[Tuple[str, str, Any]], field: str, descending: bool,
+               limit: Optional[int], after_key: Optional[tuple]) -> List[Customer]:
+        """Filters and sorts the raw log records and rehydrates only the page."""
+        page = select_records(((item, item) for item in self.iter_records()), conditions, field, descending,
+                               limit, after_key)
+        return self._rehydrate(page, self._from_raw)
+
+
+class _ThreadConnection:
+    """A thread's SQLite connection, stored in thread-local storage so it dies with its thread."""
+    __slots__ = ('conn', '__weakref__')
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
 
 
 class SQLiteRepository(CustomerRepository):
-    def __init__(self, db_path: str):
+    JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+    SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+    COLUMNS = ('id', 'name', 'email', 'phone', 'type', 'loyalty_points', 'company_name', 'tax_id', 'position',
+               'seniority', 'revision')
+
+    # Queries are kept as constants so each connection reuses its cached prepared statements
+    # An update keeps the rowid of the row, so the full-text index entry is updated in place
+    UPSERT_QUERY = '''
+        INSERT INTO customers 
+        (id, name, email, phone, type, loyalty_points, company_name, tax_id, position, seniority, revision)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, (SELECT COALESCE(MAX(revision), 0) + 1 FROM customers))
+        ON CONFLICT (id) DO UPDATE SET
+            name = excluded.name, email = excluded.email, phone = excluded.phone, type = excluded.type,
+            loyalty_points = excluded.loyalty_points, company_name = excluded.company_name,
+            tax_id = excluded.tax_id, position = excluded.position, seniority = excluded.seniority,
+            revision = excluded.revision
+    '''
+    SELECT_ALL_QUERY = ("SELECT id, name, email, phone, type, loyalty_points, company_name, tax_id, position, "
+                        "seniority, revision FROM customers")
+    # The revision is computed inside the write transaction, so it follows the commit order
+    SELECT_CHANGES_QUERY = SELECT_ALL_QUERY + " WHERE revision > ? ORDER BY revision LIMIT ?"
+    # Full-text search over an FTS5 index of SEARCH_WEIGHTS' fields, ranked by bm25 (lower is better).
+    # The score is the last column of each row
+    SEARCH_QUERY = (
+        "SELECT " + ", ".join(f"c.{column}" for column in COLUMNS) + ", "
+        "bm25(customers_fts, " + ", ".join(str(w) for w in SEARCH_WEIGHTS.values()) + ") AS score "
+        "FROM customers_fts JOIN customers c ON c.rowid = customers_fts.rowid WHERE customers_fts MATCH ? "
+        "ORDER BY score, c.id LIMIT ? OFFSET ?"
+    )
+    SELECT_BY_ID_QUERY = SELECT_ALL_QUERY + " WHERE id = ?"
+    # Secondary lookups, each backed by an index created in _create_table
+    SELECT_BY_FIELD_QUERIES = {
+        'email': SELECT_ALL_QUERY + " WHERE email = ?",
+        'phone': SELECT_ALL_QUERY + " WHERE phone = ?",
+        'type': SELECT_ALL_QUERY + " WHERE type = ?",
+        'company_name': SELECT_ALL_QUERY + " WHERE company_name = ?",
+    }
+    # Extra indexes for range filters and sorts pushed down by query()
+    QUERY_INDEXES = ('loyalty_points', 'name', 'revision')
+    # Columns added after the first release, created on databases that predate them
+    ADDED_COLUMNS = {'seniority': 'INTEGER', 'revision': 'INTEGER'}
+    NOT_NULL_COLUMNS = ('id', 'name', 'email', 'type')
+    SQL_COMPARISONS = {'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+    def __init__(self, db_path: str, journal_mode: str = 'WAL', synchronous: str = 'NORMAL',
+                 cache_size: Optional[int] = None, mmap_size: Optional[int] = None,
+                 cached_statements: int = 128, verify: bool = False):
+        """
+        Each thread gets its own long-lived connection, opened on first use and tuned with
+        the given pragmas. `cache_size` and `mmap_size` keep SQLite's defaults when None.
+        Call close() (or use the repository in a `with` block) to release the connections.
+        With verify=True every loaded row is validated again (see Customer.from_row).
+        """
+        journal_mode = journal_mode.upper()
+        synchronous = synchronous.upper()
+        if journal_mode not in self.JOURNAL_MODES:
+            raise ValueError(f'Unknown journal mode: {journal_mode}')
+        if synchronous not in self.SYNCHRONOUS_MODES:
+            raise ValueError(f'Unknown synchronous mode: {synchronous}')
+
         self.db_path = db_path
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self.verify = verify
+        self._local = threading.local()
+        # Weak: a thread's connection is only kept alive by its thread-local storage
+        self._connections: 'weakref.WeakSet[_ThreadConnection]' = weakref.WeakSet()
+        self._connections_lock = threading.Lock()
         self._create_table()
 
-    def _get_connection(self):
-        """Helper to get a connection to SQLite."""
-        return sqlite3.connect(self.db_path)
+    def connection(self) -> sqlite3.Connection:
+        """
+        Returns the calling thread's connection, opening and tuning it on first use. It is
+        closed when the thread exits, so short-lived threads don't leak file descriptors.
+        Callers running their own SQL (e.g. a statement in the same transaction as
+        upsert_rows) use it as a context manager to commit or roll back.
+        """
+        holder = getattr(self._local, 'holder', None)
+        if holder is None:
+            # Connections are only used by the thread that opened them, but close() may run elsewhere
+            conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                   cached_statements=self.cached_statements)
+            conn.execute(f'PRAGMA journal_mode = {self.journal_mode}')
+            conn.execute(f'PRAGMA synchronous = {self.synchronous}')
+            if self.cache_size is not None:
+                conn.execute(f'PRAGMA cache_size = {int(self.cache_size)}')
+            if self.mmap_size is not None:
+                conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+            holder = _ThreadConnection(conn)
+            # Runs when the thread exits and its thread-local storage (the only strong reference) is freed
+            weakref.finalize(holder, conn.close)
+            self._local.holder = holder
+            with self._connections_lock:
+                self._connections.add(holder)
+        return holder.conn
+
+    def close(self) -> None:
+        """Closes every connection opened by the repository. Using it again opens new ones."""
+        with self._connections_lock:
+            for holder in list(self._connections):
+                holder.conn.close()
+            self._connections = weakref.WeakSet()
+            self._local = threading.local()
 
     def _create_table(self):
         """Creates the customers table if it doesn't exist."""
-        with self._get_connection() as conn:
+        with self.connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS customers (
@@ -115,78 +1475,247 @@ class SQLiteRepository(CustomerRepository):
                     loyalty_points INTEGER,
                     company_name TEXT,
                     tax_id TEXT,
-                    position TEXT
+                    position TEXT,
+                    seniority INTEGER,
+                    revision INTEGER
                 )
             ''')
-            conn.commit()
+            existing = {row[1] for row in cursor.execute('PRAGMA table_info(customers)')}
+            for column, column_type in self.ADDED_COLUMNS.items():
+                if column not in existing:
+                    cursor.execute(f'ALTER TABLE customers ADD COLUMN {column} {column_type}')
+            if 'revision' not in existing:
+                # Give the rows saved before change tracking a revision, in insertion order
+                cursor.execute('UPDATE customers SET revision = rowid')
+            for column in (*self.SELECT_BY_FIELD_QUERIES, *self.QUERY_INDEXES):
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_customers_{column} ON customers ({column})')
+        # Whether search() runs in FTS5 (and search_rows() is available) or scans the table
+        self.has_fts = self._create_search_index()
 
-    def save(self, customer: Customer) -> None:
-        """Saves or updates a customer using SQL."""
+    def _create_search_index(self) -> bool:
+        """
+        Creates the FTS5 index used by search() and the triggers that keep it in sync with the
+        customers table. Returns False if this SQLite build has no FTS5 (search then scans).
+        """
+        fields = ', '.join(SEARCH_WEIGHTS)
+        new_fields = ', '.join(f'new.{field}' for field in SEARCH_WEIGHTS)
+        old_fields = ', '.join(f'old.{field}' for field in SEARCH_WEIGHTS)
+        changed = ' OR '.join(f'old.{field} IS NOT new.{field}' for field in SEARCH_WEIGHTS)
+        with self.connection() as conn:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'customers_fts'").fetchone()
+            if not exists:
+                try:
+                    # External content table: the text lives only in customers; the same word
+                    # rules as _search_terms (no accent folding)
+                    conn.execute(f'''
+                        CREATE VIRTUAL TABLE customers_fts USING fts5(
+                            {fields}, content = 'customers', content_rowid = 'rowid',
+                            tokenize = 'unicode61 remove_diacritics 0', prefix = '2 3'
+                        )
+                    ''')
+                except sqlite3.OperationalError:
+                    return False
+                conn.execute("INSERT INTO customers_fts (customers_fts) VALUES ('rebuild')")
+            conn.executescript(f'''
+                CREATE TRIGGER IF NOT EXISTS customers_fts_insert AFTER INSERT ON customers BEGIN
+                    INSERT INTO customers_fts (rowid, {fields}) VALUES (new.rowid, {new_fields});
+                END;
+                CREATE TRIGGER IF NOT EXISTS customers_fts_delete AFTER DELETE ON customers BEGIN
+                    INSERT INTO customers_fts (customers_fts, rowid, {fields}) VALUES ('delete', old.rowid, {old_fields});
+                END;
+                CREATE TRIGGER IF NOT EXISTS customers_fts_update AFTER UPDATE ON customers WHEN {changed} BEGIN
+                    INSERT INTO customers_fts (customers_fts, rowid, {fields}) VALUES ('delete', old.rowid, {old_fields});
+                    INSERT INTO customers_fts (rowid, {fields}) VALUES (new.rowid, {new_fields});
+                END;
+            ''')
+        return True
+
+    @staticmethod
+    def to_fields(customer: Customer) -> tuple:
+        """Flattens a customer into the column order used by UPSERT_QUERY (and upsert_rows)."""
         data = customer.to_dict()
         
         # Prepare the fields. If they don't exist in the dict (e.g. Regular), set them to None
-        fields = (
+        return (
             data['id'], data['name'], data['email'], data['phone'], data['type'],
             data.get('loyalty_points'), data.get('company_name'), 
-            data.get('tax_id'), data.get('position')
+            data.get('tax_id'), data.get('position'), data.get('seniority')
         )
 
-        query = '''
-            INSERT OR REPLACE INTO customers 
-            (id, name, email, phone, type, loyalty_points, company_name, tax_id, position)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        '''
-        
-        with self._get_connection() as conn:
-            conn.execute(query, fields)
-            conn.commit()
+    def upsert_rows(self, rows: Iterable[tuple]) -> None:
+        """
+        Inserts or updates rows already flattened with to_fields, on the calling thread's
+        connection and without committing: run it in a `with repository.connection():` block,
+        which can also hold other statements of the same transaction.
+        """
+        self.connection().executemany(self.UPSERT_QUERY, rows)
+
+    @instrumented('save')
+    def save(self, customer: Customer) -> None:
+        """Saves or updates a customer using SQL."""
+        fields = self.to_fields(customer)
+
+        # The connection context manager commits the transaction (or rolls it back on error)
+        with self.connection() as conn:
+            conn.execute(self.UPSERT_QUERY, fields)
+
+    @instrumented('save_many')
+    def save_many(self, customers: Iterable[Customer], chunk_size: int = 500) -> List[Tuple[Any, Exception]]:
+        """Saves customers with executemany, committing one transaction per chunk."""
+        failures = []
+        conn = self.connection()
+        for chunk in chunked(customers, chunk_size):
+            valid, rows = [], []
+            for customer in chunk:
+                try:
+                    rows.append(self.to_fields(customer))
+                    valid.append(customer)
+                except Exception as e:
+                    failures.append((customer, e))
 
+            try:
+                with conn:
+                    self.upsert_rows(rows)
+            except sqlite3.Error:
+                # The chunk was rolled back: retry it row by row to isolate the failing records
+                for customer, fields in zip(valid, rows):
+                    try:
+                        with conn:
+                            self.upsert_rows([fields])
+                    except sqlite3.Error as e:
+                        failures.append((customer, e))
+        return failures
+
+    def row_to_customer(self, row: tuple) -> Customer:
+        """Rehydrates a row into the specific Customer object."""
+        # row is a tuple in COLUMNS order: (id, name, email, phone, type, loyalty, company, tax, pos, seniority, revision)
+        data = dict(zip(self.COLUMNS, row))
+        customer_class = CUSTOMER_TYPES.get(data['type'])
+        if customer_class is None:
+            # For now, raise a custom exception and stop the program
+            # Later, we can ignore the unknown customer type and register it as a warning 
+            # in the log
+            raise SCMError(f"Unknown customer type: {data['type']}")
+        return customer_class.from_row(data, self.verify)
+
+    def fetch(self, query: str, params: tuple = ()) -> list:
+        """Runs a SELECT and returns all its rows, timed as the 'storage_read' operation."""
+        with metrics.timer('storage_read', type(self).__name__):
+            with self.connection() as conn:
+                return conn.execute(query, params).fetchall()
+
+    @instrumented('get_all')
     def get_all(self) -> List[Customer]:
         """Fetches all rows and rehydrates them into Customer objects."""
-        customers = []
-        query = "SELECT * FROM customers"
-        
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            rows = cursor.execute(query).fetchall()
-            
+        return self._rehydrate(self.fetch(self.SELECT_ALL_QUERY), self.row_to_customer)
+
+    def iter_row_batches(self, batch_size: int = 500) -> Iterator[List[tuple]]:
+        """
+        Steps through the table with fetchmany, yielding lists of at most `batch_size` rows in
+        COLUMNS order, so only one batch is in memory at a time.
+        """
+        cursor = self.connection().cursor()
+        try:
+            cursor.execute(self.SELECT_ALL_QUERY)
+            while True:
+                with metrics.timer('storage_read', type(self).__name__):
+                    rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+    @instrumented('iter_all')
+    def iter_all(self, batch_size: int = 500) -> Iterator[Customer]:
+        """Rehydrates one batch of rows at a time (see iter_row_batches)."""
+        for rows in self.iter_row_batches(batch_size):
+            yield from self._rehydrate(rows, self.row_to_customer)
+
+    @instrumented('changes_since')
+    def changes_since(self, token: Optional[int] = None,
+                      limit: Optional[int] = None) -> Tuple[List[Customer], int]:
+        """Reads the changed rows through the revision index."""
+        # LIMIT -1 means no limit
+        rows = self.fetch(self.SELECT_CHANGES_QUERY, (token or 0, limit if limit is not None else -1))
+        return self._rehydrate(rows, self.row_to_customer), rows[-1][-1] if rows else (token or 0)
+
+    def iter_records(self, batch_size: int = 500) -> Iterator[dict]:
+        """Yields the rows as dictionaries, leaving out the columns a customer type doesn't use."""
+        for rows in self.iter_row_batches(batch_size):
             for row in rows:
-                # row is a tuple: (id, name, email, phone, type, loyalty, company, tax, pos)
-                c_id, name, email, phone, class_name = row[0], row[1], row[2], row[3], row[4]
-                
-                if class_name == 'RegularCustomer':
-                    obj = RegularCustomer(c_id, name, email, phone)
-                elif class_name == 'PremiumCustomer':
-                    obj = PremiumCustomer(c_id, name, email, phone, row[5] or 0)
-                elif class_name == 'CorporateCustomer':
-                    obj = CorporateCustomer(c_id, name, email, phone, row[6], row[7], row[8])
-                else:
-                    # For now, raise a custom exception and stop the program
-                    # Later, we can ignore the unknown customer type and register it as a warning 
-                    # in the log
-                    raise SCMError(f'Unknown customer type: {class_name}')
-                
-                customers.append(obj)
-        return customers
+                yield {column: value for column, value in zip(self.COLUMNS, row) if value is not None}
 
+    @instrumented('find_by_id')
     def find_by_id(self, customer_id: str) -> Optional[Customer]:
         """Finds a single customer by ID using a WHERE clause."""
-        query = "SELECT * FROM customers WHERE id = ?"
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            row = cursor.execute(query, (customer_id,)).fetchone()
-            
-            if not row:
-                return None
-            
-            # Reuse the same rehydration logic (could be refactored later)
-            class_name = row[4]
-            if class_name == 'RegularCustomer':
-                return RegularCustomer(row[0], row[1], row[2], row[3])
-            elif class_name == 'PremiumCustomer':
-                return PremiumCustomer(row[0], row[1], row[2], row[3], row[5])
-            elif class_name == 'CorporateCustomer':
-                return CorporateCustomer(row[0], row[1], row[2], row[3], row[6], row[7], row[8])
+        rows = self.fetch(self.SELECT_BY_ID_QUERY, (customer_id,))
+        return self._rehydrate(rows, self.row_to_customer)[0] if rows else None
+
+    def _find_by(self, field: str, value: Any) -> List[Customer]:
+        """Runs an indexed WHERE lookup on the given column."""
+        return self._rehydrate(self.fetch(self.SELECT_BY_FIELD_QUERIES[field], (value,)), self.row_to_customer)
+
+    def _query(self, conditions: List[Tuple[str, str, Any]], field: str, descending: bool,
+               limit: Optional[int], after_key: Optional[tuple]) -> List[Customer]:
+        """Pushes the filters, the keyset condition, the sort and the limit down into one SELECT."""
+        clauses, params = [], []
+        for column, op, value in conditions:
+            if not op:
+                if value is None:
+                    clauses.append(f'{column} IS NULL')
+                else:
+                    clauses.append(f'{column} = ?')
+                    params.append(value)
+            elif op == 'in':
+                clauses.append(f"{column} IN ({', '.join('?' * len(value))})")
+                params.extend(value)
+            else:
+                clauses.append(f'{column} {self.SQL_COMPARISONS[op]} ?')
+                params.append(value)
+
+        # Missing values sort like in the other repositories (see sort_key)
+        if field in self.NOT_NULL_COLUMNS:
+            sort_expression = field
+        else:
+            sort_expression = f'COALESCE({field}, {_SORT_DEFAULTS[field]!r})'
+        direction = 'DESC' if descending else 'ASC'
+        if after_key is not None:
+            comparison = '<' if descending else '>'
+            if field == 'id':
+                clauses.append(f'id {comparison} ?')
+                params.append(after_key[1])
             else:
-                # For now, raise a custom exception and stop the program
-                raise SCMError(f'Unknown customer type: {class_name}')
\ No newline at end of file
+                clauses.append(f'({sort_expression}, id) {comparison} (?, ?)')
+                params.extend(after_key)
+
+        query = self.SELECT_ALL_QUERY
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        query += f' ORDER BY {sort_expression} {direction}'
+        if field != 'id':
+            query += f', id {direction}'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        return self._rehydrate(self.fetch(query, tuple(params)), self.row_to_customer)
+
+    def _search(self, terms: List[str], fields: Tuple[str, ...], limit: int, offset: int) -> List[Customer]:
+        """Runs an FTS5 prefix query ('"tech"* "corp"*'), restricted to `fields`, ranked by bm25."""
+        if not self.has_fts:
+            return super()._search(terms, fields, limit, offset)
+        rows = self.search_rows(terms, fields, limit, offset)
+        return self._rehydrate([row[:-1] for row in rows], self.row_to_customer)
+
+    def search_rows(self, terms: List[str], fields: Tuple[str, ...], limit: int, offset: int) -> List[tuple]:
+        """
+        Returns the rows of a search page (`terms` and `fields` as parsed by search()) with
+        their bm25 score appended, e.g. to merge the pages of several databases by score.
+        Requires FTS5 (see has_fts).
+        """
+        # Terms are plain words (see _search_terms), so quoting them is enough to escape them
+        match = ' '.join(f'"{term}"*' for term in terms)
+        if len(fields) < len(SEARCH_WEIGHTS):
+            match = f"{{{' '.join(fields)}}} : ({match})"
+        return self.fetch(self.SEARCH_QUERY, (match, limit, offset))
@@ -0,0 +1,248 @@
+import heapq
+import json
+import os
+import tempfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from core.models import Customer
+from data.repository import CustomerRepository, SQLiteRepository, chunked, sort_key
+from utils.metrics import instrumented
+
+
+class ShardedSQLiteRepository(CustomerRepository):
+    """
+    Customers hash-partitioned by customer_id across several SQLite files (shards), so
+    writes to different shards don't wait for each other's lock. save and find_by_id go to
+    a single shard; save_many writes its shards in parallel; get_all, the find_by_* lookups,
+    query and search run on every shard in parallel threads and merge the results.
+    """
+
+    MANIFEST = 'shards.json'
+
+    def __init__(self, directory: str, shards: Optional[int] = None, **sqlite_options):
+        """
+        Keeps the shards in `directory` as shard_<i>_of_<n>.db files, plus a manifest with
+        the shard count. `shards` is required for a new store; an existing one is opened with
+        its own count (a different `shards` raises ValueError: use reshard()). The other
+        keyword arguments are passed to every SQLiteRepository (journal_mode, cache_size...).
+        """
+        self.directory = directory
+        self.sqlite_options = sqlite_options
+        os.makedirs(directory, exist_ok=True)
+        stored = self._read_manifest()
+        if stored is None:
+            if shards is None:
+                raise ValueError(f"No sharded store in '{directory}': pass the number of shards to create one")
+            if shards < 1:
+                raise ValueError('shards must be a positive number')
+            self._open_shards(shards)
+            self._write_manifest(shards)
+        else:
+            if shards is not None and shards != stored:
+                raise ValueError(f"The store in '{directory}' has {stored} shards, not {shards}: use reshard()")
+            self._open_shards(stored)
+
+    # --- Shard Helpers ---
+    def _shard_path(self, index: int, count: int) -> str:
+        return os.path.join(self.directory, f'shard_{index}_of_{count}.db')
+
+    def _read_manifest(self) -> Optional[int]:
+        path = os.path.join(self.directory, self.MANIFEST)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)['shards']
+
+    def _write_manifest(self, count: int) -> None:
+        """Replaces the manifest atomically: it is what decides which set of shard files is live."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"shards": count}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(self.directory, self.MANIFEST))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def _open_shards(self, count: int) -> None:
+        self._shards = [SQLiteRepository(self._shard_path(i, count), **self.sqlite_options) for i in range(count)]
+        # One thread per shard, started on first use; each thread keeps its own connection to every shard
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _map(self, func: Callable, items: list) -> list:
+        """Runs func(item) for every item in the shard threads and returns the results in order."""
+        if len(items) <= 1:
+            return [func(item) for item in items]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=len(self._shards), thread_name_prefix='shard')
+        return list(self._executor.map(func, items))
+
+    @property
+    def shard_count(self) -> int:
+        return len(self._shards)
+
+    @staticmethod
+    def _shard_index(customer_id: str, count: int) -> int:
+        # crc32 is stable across processes and runs, unlike hash() on strings
+        return zlib.crc32(customer_id.encode('utf-8')) % count
+
+    def _shard_for(self, customer_id: str) -> SQLiteRepository:
+        return self._shards[self._shard_index(customer_id, len(self._shards))]
+
+    def _fan_out(self, func: Callable[[SQLiteRepository], Any]) -> list:
+        """Runs func(shard) on every shard in parallel and returns the results in shard order."""
+        return self._map(func, self._shards)
+
+    # --- Repository Interface ---
+    @instrumented('save')
+    def save(self, customer: Customer) -> None:
+        self._shard_for(customer.customer_id).save(customer)
+
+    @instrumented('save_many')
+    def save_many(self, customers: Iterable[Customer], chunk_size: int = 500) -> List[Tuple[Any, Exception]]:
+        """Splits every chunk by shard and writes the parts in parallel, one transaction per shard."""
+        failures = []
+        for chunk in chunked(customers, chunk_size):
+            groups: Dict[int, List[Customer]] = {}
+            for customer in chunk:
+                try:
+                    index = self._shard_index(customer.customer_id, len(self._shards))
+                except Exception as e:
+                    failures.append((customer, e))
+                    continue
+                groups.setdefault(index, []).append(customer)
+            parts = [(self._shards[index], group) for index, group in groups.items()]
+            for shard_failures in self._map(lambda part: part[0].save_many(part[1], chunk_size), parts):
+                failures.extend(shard_failures)
+        return failures
+
+    @instrumented('find_by_id')
+    def find_by_id(self, customer_id: str) -> Optional[Customer]:
+        return self._shard_for(customer_id).find_by_id(customer_id)
+
+    @instrumented('get_all')
+    def get_all(self) -> List[Customer]:
+        """Every customer, shard by shard (there is no global insertion order across shards)."""
+        return [customer for customers in self._fan_out(SQLiteRepository.get_all) for customer in customers]
+
+    @instrumented('iter_all')
+    def iter_all(self, batch_size: int = 500) -> Iterator[Customer]:
+        for shard in self._shards:
+            yield from shard.iter_all(batch_size)
+
+    def iter_records(self, batch_size: int = 500) -> Iterator[dict]:
+        for shard in self._shards:
+            yield from shard.iter_records(batch_size)
+
+    def _find_by(self, field: str, value: Any) -> List[Customer]:
+        """Runs the indexed lookup on every shard in parallel."""
+        results = self._fan_out(lambda shard: shard._find_by(field, value))
+        return [customer for customers in results for customer in customers]
+
+    def _query(self, conditions: List[Tuple[str, str, Any]], field: str, descending: bool,
+               limit: Optional[int], after_key: Optional[tuple]) -> List[Customer]:
+        """
+        Every shard returns its own first `limit` customers of the page, already sorted in SQL;
+        merging those sorted lists gives the first `limit` customers of the whole store.
+        """
+        results = self._fan_out(lambda shard: shard._query(conditions, field, descending, limit, after_key))
+        keyed = [[(sort_key(customer.to_dict(), field), customer) for customer in customers]
+                 for customers in results]
+        # Keys end with the unique ID, so customers are never compared
+        merged = heapq.merge(*keyed, key=lambda item: item[0], reverse=descending)
+        return [customer for _, customer in islice(merged, limit)]
+
+    def _search(self, terms: List[str], fields: Tuple[str, ...], limit: int, offset: int) -> List[Customer]:
+        """
+        Merges the best `offset + limit` hits of every shard by their bm25 score. The ranking
+        is approximate: bm25 weighs terms by statistics (document count, term frequency,
+        average length) that each shard computes over its own customers only, so scores from
+        different shards are not strictly comparable. The same hits are found; their order
+        can differ slightly from a single SQLiteRepository.
+        """
+        if not all(shard.has_fts for shard in self._shards):
+            return super()._search(terms, fields, limit, offset)
+        results = self._fan_out(lambda shard: shard.search_rows(terms, fields, offset + limit, 0))
+        # Rows end with (..., revision, score); each shard's rows are already in (score, id) order
+        merged = heapq.merge(*results, key=lambda row: (row[-1], row[0]))
+        rows = [row[:-1] for row in islice(merged, offset, offset + limit)]
+        return self._rehydrate(rows, self._shards[0].row_to_customer)
+
+    @instrumented('changes_since')
+    def changes_since(self, token: Optional[List[int]] = None,
+                      limit: Optional[int] = None) -> Tuple[List[Customer], List[int]]:
+        """
+        Revisions are counted per shard, so the token is a list with one revision per shard.
+        A token from before a reshard (or None) starts over from the beginning.
+        """
+        if token is None or len(token) != len(self._shards):
+            token = [0] * len(self._shards)
+        changes, next_token = [], list(token)
+        for i, shard in enumerate(self._shards):
+            remaining = limit - len(changes) if limit is not None else None
+            if remaining == 0:
+                break
+            shard_changes, next_token[i] = shard.changes_since(token[i], remaining)
+            changes.extend(shard_changes)
+        return changes, next_token
+
+    @instrumented('reshard')
+    def reshard(self, shards: int, batch_size: int = 2000) -> None:
+        """
+        Moves every customer to a new set of `shards` files and switches the manifest to it.
+        Until the switch the old shards stay live, so an interrupted reshard loses nothing
+        (run it again). Writers must be stopped while it runs. Change tokens start over.
+        """
+        if shards < 1:
+            raise ValueError('shards must be a positive number')
+        old_count = len(self._shards)
+        if shards == old_count:
+            return
+
+        for i in range(shards):
+            # Leftovers of an interrupted reshard to the same count
+            path = self._shard_path(i, shards)
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        targets = [SQLiteRepository(self._shard_path(i, shards), **self.sqlite_options) for i in range(shards)]
+
+        def write(part: Tuple[int, List[tuple]]) -> None:
+            target = targets[part[0]]
+            with target.connection():
+                target.upsert_rows(part[1])
+
+        try:
+            # Sources are read one at a time and each batch is written to its targets in
+            # parallel, so no two threads ever wait for the same target's write lock
+            for source in self._shards:
+                for rows in source.iter_row_batches(batch_size):
+                    groups: Dict[int, List[tuple]] = {}
+                    for row in rows:
+                        # The revision (last column) is stamped again by the target shard
+                        groups.setdefault(self._shard_index(row[0], shards), []).append(row[:-1])
+                    self._map(write, list(groups.items()))
+        finally:
+            for target in targets:
+                target.close()
+
+        self._write_manifest(shards)
+        self.close()
+        for i in range(old_count):
+            path = self._shard_path(i, old_count)
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        self._open_shards(shards)
+
+    def close(self) -> None:
+        """Stops the fan-out threads and closes every shard's connections. Using it again reopens them."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for shard in self._shards:
+            shard.close()
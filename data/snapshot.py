@@ -0,0 +1,195 @@
+"""
+Binary snapshot of a customer store, opened with mmap for an instant cold start.
+
+Layout (little-endian):
+    header   magic b'SCMSNAP1', version (u32), flags (u32), record count (u64), index offset (u64)
+    records  one per customer: payload length (u32) + the stored record as compact UTF-8 JSON
+    index    one (64-bit ID hash, record offset) pair per customer (u64, u64), sorted by hash
+
+Opening a snapshot only reads the header. find_by_id bisects the index inside the mapping
+and parses only the record it lands on; the operating system pages in what is touched.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+from core.models import Customer
+from data.repository import (CustomerRepository, chunked, customer_from_dict, fsync_directory, rank_records,
+                             select_changes, select_records)
+from utils.exceptions import CorruptStorageError, SCMError
+from utils.metrics import instrumented, metrics
+
+MAGIC = b'SCMSNAP1'
+VERSION = 1
+_HEADER = struct.Struct('<8sIIQQ')
+_LENGTH = struct.Struct('<I')
+_ENTRY = struct.Struct('<QQ')
+
+
+def _id_hash(customer_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(customer_id.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+@instrumented('write_snapshot', component='snapshot')
+def write_snapshot(repository: CustomerRepository, file_path: str, batch_size: int = 2000) -> dict:
+    """
+    Writes a snapshot of every customer of `repository` (any backend, read through
+    iter_records) to `file_path`. The file is written next to the target and renamed over it
+    once complete, so a snapshot in use by readers is replaced atomically.
+    Returns the number of records and the size of the file.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    hashes, offsets = array('Q'), array('Q')
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            # Placeholder header: the count and index offset are known at the end
+            f.write(_HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+            position = _HEADER.size
+            for record in repository.iter_records(batch_size):
+                payload = json.dumps(record, separators=(',', ':')).encode('utf-8')
+                f.write(_LENGTH.pack(len(payload)))
+                f.write(payload)
+                hashes.append(_id_hash(record['id']))
+                offsets.append(position)
+                position += _LENGTH.size + len(payload)
+
+            index_offset = position
+            order = sorted(range(len(hashes)), key=hashes.__getitem__)
+            for chunk in chunked(order, batch_size):
+                f.write(b''.join(_ENTRY.pack(hashes[i], offsets[i]) for i in chunk))
+            f.seek(0)
+            f.write(_HEADER.pack(MAGIC, VERSION, 0, len(hashes), index_offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    fsync_directory(directory)
+    return {"records": len(hashes), "size": os.path.getsize(file_path)}
+
+
+class SnapshotRepository(CustomerRepository):
+    """
+    Read-only CustomerRepository over a snapshot written by write_snapshot. Opening it is
+    O(1) whatever the size of the store; records are parsed only when they are read.
+    Lookups other than by ID scan the records (without building Customer objects).
+    """
+
+    def __init__(self, file_path: str, verify: bool = False):
+        """With verify=True every loaded record is validated again (see Customer.from_row)."""
+        self.file_path = file_path
+        self.verify = verify
+        with open(file_path, 'rb') as f:
+            try:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:  # An empty file can't be mapped
+                raise CorruptStorageError(file_path, e) from e
+        try:
+            if len(self._mm) < _HEADER.size:
+                raise CorruptStorageError(file_path, 'truncated header')
+            magic, version, _, self._count, self._index_offset = _HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC:
+                raise CorruptStorageError(file_path, 'not a customer snapshot')
+            if version != VERSION:
+                raise CorruptStorageError(file_path, f'unsupported snapshot version {version}')
+            if self._index_offset + self._count * _ENTRY.size != len(self._mm):
+                raise CorruptStorageError(file_path, 'size does not match the header')
+        except CorruptStorageError:
+            self._mm.close()
+            raise
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _from_raw(self, item: dict) -> Customer:
+        return customer_from_dict(item, self.verify)
+
+    def _read_record(self, offset: int) -> Tuple[dict, int]:
+        """Parses the record at `offset`. Returns it and the offset of the next record."""
+        (length,) = _LENGTH.unpack_from(self._mm, offset)
+        start = offset + _LENGTH.size
+        return json.loads(self._mm[start:start + length]), start + length
+
+    def _lookup(self, customer_id: str) -> Optional[dict]:
+        """Bisects the hash-sorted index, then checks the ID of the record(s) with that hash."""
+        target = _id_hash(customer_id)
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if _ENTRY.unpack_from(self._mm, self._index_offset + middle * _ENTRY.size)[0] < target:
+                low = middle + 1
+            else:
+                high = middle
+        while low < self._count:
+            entry_hash, offset = _ENTRY.unpack_from(self._mm, self._index_offset + low * _ENTRY.size)
+            if entry_hash != target:
+                break
+            record = self._read_record(offset)[0]
+            if record['id'] == customer_id:
+                return record
+            low += 1
+        return None
+
+    # --- Repository Interface ---
+    def save(self, customer: Customer) -> None:
+        raise SCMError(f"Snapshot '{self.file_path}' is read-only: write a new one with write_snapshot()")
+
+    def save_many(self, customers: Iterable[Customer], chunk_size: int = 500) -> List[Tuple[Any, Exception]]:
+        raise SCMError(f"Snapshot '{self.file_path}' is read-only: write a new one with write_snapshot()")
+
+    @instrumented('find_by_id')
+    def find_by_id(self, customer_id: str) -> Optional[Customer]:
+        """Reads only the index entries on the bisection path and the matching record."""
+        with metrics.timer('storage_read', type(self).__name__):
+            item = self._lookup(customer_id)
+        return self._rehydrate([item], self._from_raw)[0] if item is not None else None
+
+    def iter_records(self, batch_size: int = 500) -> Iterator[dict]:
+        """Yields the stored records in the order of the source repository."""
+        position = _HEADER.size
+        while position < self._index_offset:
+            with metrics.timer('storage_read', type(self).__name__):
+                chunk = []
+                while position < self._index_offset and len(chunk) < batch_size:
+                    record, position = self._read_record(position)
+                    chunk.append(record)
+            yield from chunk
+
+    @instrumented('get_all')
+    def get_all(self) -> List[Customer]:
+        return self._rehydrate(list(self.iter_records()), self._from_raw)
+
+    @instrumented('iter_all')
+    def iter_all(self, batch_size: int = 500) -> Iterator[Customer]:
+        for chunk in chunked(self.iter_records(batch_size), batch_size):
+            yield from self._rehydrate(chunk, self._from_raw)
+
+    def _find_by(self, field: str, value: Any) -> List[Customer]:
+        return self._rehydrate([item for item in self.iter_records() if item.get(field) == value], self._from_raw)
+
+    def _query(self, conditions: List[Tuple[str, str, Any]], field: str, descending: bool,
+               limit: Optional[int], after_key: Optional[tuple]) -> List[Customer]:
+        page = select_records(((item, item) for item in self.iter_records()), conditions, field, descending,
+                               limit, after_key)
+        return self._rehydrate(page, self._from_raw)
+
+    def _search(self, terms: List[str], fields: Tuple[str, ...], limit: int, offset: int) -> List[Customer]:
+        page = rank_records(((item, item) for item in self.iter_records()), terms, fields, limit, offset)
+        return self._rehydrate(page, self._from_raw)
+
+    @instrumented('changes_since')
+    def changes_since(self, token: Optional[int] = None,
+                      limit: Optional[int] = None) -> Tuple[List[Customer], int]:
+        """The revisions of the source repository are kept, so a snapshot can seed a sync."""
+        changes, token = select_changes(self.iter_records(), token, limit)
+        return self._rehydrate(changes, self._from_raw), token
+
+    def close(self) -> None:
+        """Unmaps the file."""
+        self._mm.close()
@@ -0,0 +1,77 @@
+import json
+import os
+from typing import Dict, Optional
+from data.repository import CustomerRepository, chunked, unwrap
+from utils.metrics import instrumented
+
+
+@instrumented('sync_changes', component='sync')
+def sync_changes(source: CustomerRepository, target: CustomerRepository, token: Optional[int] = None,
+                 batch_size: int = 500) -> dict:
+    """
+    Copies the customers changed in `source` since `token` (see changes_since) to `target`.
+    Customers whose stored data is already identical in the target are not written again, so
+    syncing back in the other direction doesn't bounce the same records between the stores.
+    Returns the counts, the (customer, error) pairs the target rejected and the `token` to pass
+    to the next sync from the same source. If a customer changed in both stores, the last sync
+    direction wins.
+    """
+    copied = unchanged = 0
+    failures = []
+    while True:
+        changes, next_token = source.changes_since(token, limit=batch_size)
+        if not changes:
+            break
+
+        # The first call also returns every record written before change tracking, however
+        # many there are: compare and write them `batch_size` at a time
+        for chunk in chunked(changes, batch_size):
+            # One lookup per chunk instead of a find_by_id per customer
+            current, _ = target.query(filter={'id__in': [c.customer_id for c in chunk]}, limit=None)
+            current_data = {c.customer_id: c.to_dict() for c in current}
+            modified = [c for c in chunk if current_data.get(c.customer_id) != c.to_dict()]
+
+            failures.extend(target.save_many(modified, batch_size))
+            copied += len(modified)
+            unchanged += len(chunk) - len(modified)
+        token = next_token
+
+    return {
+        "copied": copied - len(failures),
+        "unchanged": unchanged,
+        "failures": failures,
+        "token": token
+    }
+
+
+class SyncState:
+    """
+    Remembers the last sync token of every (source, target) pair in a small JSON file, so a
+    periodic sync only copies what changed since the previous run.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._tokens: Dict[str, int] = {}
+        if os.path.exists(file_path):
+            with open(file_path, 'r', encoding='utf-8') as f:
+                self._tokens = json.load(f)
+
+    @staticmethod
+    def _key(source: CustomerRepository, target: CustomerRepository) -> str:
+        def location(repository: CustomerRepository) -> str:
+            # Wrappers (e.g. CachedRepository) share the location of the store they wrap
+            repository = unwrap(repository)
+            path = (getattr(repository, 'file_path', None) or getattr(repository, 'db_path', None)
+                    or getattr(repository, 'directory', None))
+            return os.path.abspath(path) if path else type(repository).__name__
+        return f"{location(source)} -> {location(target)}"
+
+    def sync(self, source: CustomerRepository, target: CustomerRepository, batch_size: int = 500) -> dict:
+        """Syncs source into target from the saved token, then saves the new token."""
+        key = self._key(source, target)
+        result = sync_changes(source, target, self._tokens.get(key), batch_size)
+        self._tokens[key] = result["token"]
+        with open(self.file_path, 'w', encoding='utf-8') as f:
+            json.dump(self._tokens, f, indent=4)
+        return result
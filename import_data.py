@@ -0,0 +1,221 @@
+"""
+Bulk import of customers from CSV or JSON Lines files.
+
+Usage:
+    python3 import_data.py customers.csv [--target storage/scm_system.db] [--workers 4]
+                           [--batch-size 2000] [--rejects customers.rejects.jsonl]
+
+Columns (CSV) or keys (JSON Lines) are the stored customer fields: id, name, email, phone,
+type (RegularCustomer, PremiumCustomer or CorporateCustomer), loyalty_points, company_name,
+tax_id, position and seniority. The file is streamed: worker processes validate each batch,
+a single writer saves it with save_many, and every rejected row is written to the reject
+file together with its validation error messages.
+"""
+import argparse
+import csv
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from core.models import CUSTOMER_TYPES
+from core.validators import DataValidator
+from data.repository import (QUERY_FIELDS, CustomerRepository, JSONLinesRepository, JSONRepository,
+                             SQLiteRepository, chunked, customer_from_dict)
+from utils.logger import log_error, log_info
+from utils.pipeline import Progress, ordered_map
+
+NUMERIC_FIELDS = ('loyalty_points', 'seniority')
+# Fields every record of a type must have, besides id, name, email, phone and type
+REQUIRED_FIELDS = {'CorporateCustomer': ('company_name', 'tax_id', 'position')}
+
+
+def open_repository(path: str) -> CustomerRepository:
+    """Opens the repository matching a file extension: .db/.sqlite (SQLite), .jsonl or .json."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.db', '.sqlite', '.sqlite3'):
+        return SQLiteRepository(path)
+    if extension == '.jsonl':
+        return JSONLinesRepository(path)
+    if extension == '.json':
+        # Buffered, so each batch is written once instead of once per customer
+        return JSONRepository(path, buffered=True)
+    raise ValueError(f"Unknown storage type for '{path}': use .db, .jsonl or .json")
+
+
+def _read_lines(path: str, on_read) -> Iterator[str]:
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for line in f:
+            on_read(len(line))
+            yield line
+
+
+def _read_records(path: str, file_format: str, on_read) -> Iterator[Any]:
+    """Yields CSV rows as dictionaries, or the non-blank JSON Lines as raw strings (parsed by the workers)."""
+    if file_format == 'csv':
+        yield from csv.DictReader(_read_lines(path, on_read))
+    else:
+        for line in _read_lines(path, on_read):
+            if line.strip():
+                yield line.rstrip('\r\n')
+
+
+def _normalize(item: Any) -> Tuple[Optional[dict], Dict[str, str]]:
+    """
+    Turns a CSV row or a JSON line into a stored-format dictionary: empty values are dropped
+    and numeric fields converted. Returns the record (None if unreadable) and its errors.
+    """
+    if isinstance(item, str):
+        try:
+            item = json.loads(item)
+        except json.JSONDecodeError as e:
+            return None, {'record': f"Invalid JSON: {e}"}
+    if not isinstance(item, dict):
+        return None, {'record': "Expected an object with the customer fields"}
+
+    record, errors = {}, {}
+    for field in QUERY_FIELDS:
+        value = item.get(field)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        if field in NUMERIC_FIELDS:
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                errors[field] = f"{field} must be a whole number: '{value}'"
+                continue
+        record[field] = value
+
+    customer_type = record.get('type')
+    if customer_type not in CUSTOMER_TYPES:
+        errors['type'] = f"Unknown customer type: {customer_type}" if customer_type else "Missing type"
+    for field in ('id',) + REQUIRED_FIELDS.get(customer_type, ()):
+        if field not in record:
+            errors[field] = f"Missing {field}"
+    return record, errors
+
+
+def _prepare_import_chunk(start: int, items: list) -> Tuple[int, int, list, list]:
+    """
+    Validates a chunk of rows in a worker process. Returns the chunk position and size, the
+    (row number, customer) pairs of the valid rows and the (row number, original row, errors)
+    of the rejected ones. Row numbers count records from 1.
+    """
+    rejects, candidates = [], []
+    for i, item in enumerate(items):
+        record, errors = _normalize(item)
+        if record is None:
+            rejects.append((start + i + 1, item, errors))
+        else:
+            candidates.append((i, item, record, errors))
+
+    # Name, email and phone are validated column by column, collecting every field error
+    report = DataValidator.validate_records([record for _, _, record, _ in candidates])
+    cleaned = dict(report.valid)
+    customers = []
+    for position, (i, item, record, errors) in enumerate(candidates):
+        errors.update(report.errors_for(position) or {})
+        if not errors:
+            try:
+                # The constructors check the type-specific rules (e.g. no negative loyalty points)
+                customers.append((start + i + 1, customer_from_dict(cleaned[position], verify=True)))
+                continue
+            except Exception as e:
+                errors['record'] = str(e)
+        rejects.append((start + i + 1, item, errors))
+    return start, len(items), customers, rejects
+
+
+def run_import(source_path: str, target_path: str = "storage/scm_system.db", file_format: Optional[str] = None,
+               workers: Optional[int] = None, batch_size: int = 2000, rejects_path: Optional[str] = None,
+               progress_interval: float = 5.0) -> Optional[dict]:
+    """
+    Imports a CSV or JSON Lines file into the repository at `target_path`. Existing customers
+    with the same ID are updated. Rejected rows go to `rejects_path` (by default next to the
+    source, as <source>.rejects.jsonl), one JSON object per row with its errors by field.
+    Returns a summary of the run, or None if the source does not exist.
+    """
+    print("--- SCM Bulk Import ---")
+    if not os.path.exists(source_path):
+        print(f"Error: Source file '{source_path}' not found. Nothing to import.")
+        return None
+
+    if file_format is None:
+        file_format = 'csv' if source_path.lower().endswith('.csv') else 'jsonl'
+    if file_format not in ('csv', 'jsonl'):
+        raise ValueError(f"Unknown import format: {file_format}")
+    if workers is None:
+        workers = min(4, os.cpu_count() or 1)
+    if rejects_path is None:
+        rejects_path = os.path.splitext(source_path)[0] + '.rejects.jsonl'
+
+    progress = Progress(os.path.getsize(source_path), progress_interval)
+    records_done = imported = rejected = 0
+    rejects_file = None
+    repo = open_repository(target_path)
+
+    def reject(row: int, item: Any, errors: Dict[str, str]) -> None:
+        nonlocal rejects_file, rejected
+        if rejects_file is None:
+            rejects_file = open(rejects_path, 'w', encoding='utf-8')
+        rejects_file.write(json.dumps({"row": row, "record": item, "errors": errors}) + '\n')
+        rejected += 1
+
+    try:
+        print(f"Importing {source_path} into {target_path}...")
+        items = _read_records(source_path, file_format, progress.on_read)
+        chunks = ((i * batch_size, chunk) for i, chunk in enumerate(chunked(items, batch_size)))
+
+        # Workers validate; this thread is the only writer
+        for start, count, customers, rejects in ordered_map(_prepare_import_chunk, chunks, workers):
+            for row, item, errors in rejects:
+                reject(row, item, errors)
+            rows = {id(customer): row for row, customer in customers}
+            failures = repo.save_many([customer for _, customer in customers], batch_size)
+            for customer, e in failures:
+                reject(rows[id(customer)], customer.to_dict(), {'record': str(e)})
+            imported += len(customers) - len(failures)
+            records_done = start + count
+            progress.records += count
+            progress.maybe_report(records_done)
+
+        print("-" * 40)
+        summary = (f"Import finished. {imported}/{records_done} customers imported, {rejected} rejected "
+                   f"({progress.elapsed():.1f}s, {progress.rate():,.0f} records/s).")
+        if rejected:
+            summary += f" Rejected rows: {rejects_path}"
+        print(summary)
+        log_info(summary)
+        return {
+            "total": records_done,
+            "imported": imported,
+            "rejected": rejected,
+            "rejects_path": rejects_path if rejected else None,
+            "seconds": progress.elapsed(),
+            "records_per_s": progress.rate()
+        }
+    except Exception as e:
+        error_msg = f"Import failed after {records_done} records: {e}"
+        print(error_msg)
+        log_error(error_msg)
+        return None
+    finally:
+        if rejects_file is not None:
+            rejects_file.close()
+        repo.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Bulk import customers from a CSV or JSON Lines file.")
+    parser.add_argument('source', help="CSV or JSON Lines file to import")
+    parser.add_argument('--target', default="storage/scm_system.db", help="repository file (.db, .jsonl or .json)")
+    parser.add_argument('--format', choices=('csv', 'jsonl'), help="source format (default: from the extension)")
+    parser.add_argument('--workers', type=int, default=None, help="validation processes (1 = no pool)")
+    parser.add_argument('--batch-size', type=int, default=2000, help="records per validation batch and write")
+    parser.add_argument('--rejects', help="where to write the rejected rows (JSON Lines)")
+    parser.add_argument('--progress-interval', type=float, default=5.0, help="seconds between progress lines")
+    args = parser.parse_args(argv)
+    run_import(args.source, args.target, args.format, workers=args.workers, batch_size=args.batch_size,
+               rejects_path=args.rejects, progress_interval=args.progress_interval)
+
+
+if __name__ == "__main__":
+    main()
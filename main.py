@@ -34,6 +34,7 @@ def run_demonstration():
     print("\nProcessing new data and saving to storage:")
     print("-" * 50)
     
+    new_customers = []
     for data in raw_customers:
         try:
             c_type = data[0]
@@ -42,14 +43,9 @@ def run_demonstration():
             elif c_type == "Premium":
                 customer = PremiumCustomer(data[1], data[2], data[3], data[4], data[5])
             elif c_type == "Corporate":
-                customer = CorporateCustomer(data[1], data[2], data[3], data[4], data[5], data[6], data[7])
+                customer = CorporateCustomer(data[1], data[2], data[3], data[4], data[5], data[6], data[7], data[8])
             
-            # Save the customer to the repository
-            repo.save(customer)
-            
-            msg = f"Saved {c_type} customer: {customer.name} (ID: {customer.customer_id})"
-            print(f"{msg}")
-            log_info(msg)
+            new_customers.append((c_type, customer))
         
         except ValidationError as e:
             error_msg = f"Validation error: {e}"
@@ -60,6 +56,21 @@ def run_demonstration():
             print(f"{error_msg}")
             log_error(error_msg)
 
+    # Save the valid customers in a single batch (one transaction for SQLite, one file write for JSON)
+    failures = repo.save_many(customer for _, customer in new_customers)
+    failed = set()
+    for customer, e in failures:
+        failed.add(customer)
+        error_msg = f"Unexpected error: {type(e).__name__}: {e}"
+        print(f"{error_msg}")
+        log_error(error_msg)
+
+    for c_type, customer in new_customers:
+        if customer not in failed:
+            msg = f"Saved {c_type} customer: {customer.name} (ID: {customer.customer_id})"
+            print(f"{msg}")
+            log_info(msg)
+
     # 4. Final verification: List all customers in the repository now
     final_list = repo.get_all()
     print("-" * 50)
@@ -70,5 +81,7 @@ def run_demonstration():
         sample = final_list[0]
         print(f"Sample from storage: {sample.get_details()} (Type: {type(sample).__name__})")
 
+    repo.close()
+
 if __name__ == "__main__":
     run_demonstration()
\ No newline at end of file
@@ -1,60 +1,221 @@
+"""
+JSON to SQLite migration utility.
+
+Usage:
+    python3 migrate_data.py [--source storage/scm_system.json] [--target storage/scm_system.db]
+                            [--workers 4] [--chunk-size 2000] [--dry-run] [--restart]
+
+The JSON file is parsed incrementally and split into chunks. Worker processes validate each
+chunk and turn it into table rows, and a single writer commits it to SQLite in one
+transaction, together with a checkpoint. If the run is interrupted, running it again
+resumes after the last committed chunk. The checkpoint is removed once the run completes.
+"""
+import argparse
 import os
-from data.repository import JSONRepository, SQLiteRepository
+import sqlite3
+from itertools import islice
+from typing import Iterator, List, Optional, Tuple
+from data.repository import SQLiteRepository, chunked, customer_from_dict, iter_json_array
 from utils.logger import log_info, log_error
+from utils.pipeline import Progress, ordered_map
+
+CREATE_CHECKPOINTS_QUERY = '''
+    CREATE TABLE IF NOT EXISTS migration_checkpoints (
+        source TEXT PRIMARY KEY,
+        signature TEXT NOT NULL,
+        records_done INTEGER NOT NULL,
+        migrated INTEGER NOT NULL,
+        failed INTEGER NOT NULL
+    )
+'''
+SELECT_CHECKPOINT_QUERY = "SELECT signature, records_done, migrated, failed FROM migration_checkpoints WHERE source = ?"
+SAVE_CHECKPOINT_QUERY = '''
+    INSERT OR REPLACE INTO migration_checkpoints (source, signature, records_done, migrated, failed)
+    VALUES (?, ?, ?, ?, ?)
+'''
+DELETE_CHECKPOINT_QUERY = "DELETE FROM migration_checkpoints WHERE source = ?"
+
+
+def _prepare_chunk(start: int, records: list) -> Tuple[int, int, list, list]:
+    """
+    Validates a chunk of raw JSON records and flattens the valid ones into SQLite rows.
+    Module-level so it can run in a worker process. Returns the position of the chunk, its
+    size, the rows and a (record number, customer ID, error) entry for every rejected record.
+    """
+    rows, failures = [], []
+    for i, item in enumerate(records):
+        try:
+            # verify=True goes through the constructors, so legacy data is validated like new data
+            rows.append(SQLiteRepository.to_fields(customer_from_dict(item, verify=True)))
+        except Exception as e:
+            customer_id = item.get('id') if isinstance(item, dict) else None
+            failures.append((start + i, customer_id, str(e)))
+    return start, len(records), rows, failures
+
 
-def run_migration():
+def run_migration(json_path: str = "storage/scm_system.json", db_path: str = "storage/scm_system.db",
+                  workers: Optional[int] = None, chunk_size: int = 2000, dry_run: bool = False,
+                  resume: bool = True, progress_interval: float = 5.0) -> Optional[dict]:
     """
     Migrates data from JSON storage to a SQLite database.
     This ensures continuity for existing data.
+    The source is streamed in `chunk_size` records; `workers` processes (default: up to 4)
+    validate the chunks and a single writer commits each one together with a checkpoint.
+    With resume=True a previous interrupted run of the same, unchanged source continues after
+    its last committed chunk; a completed run removes its checkpoint, so running the migration
+    again reads the whole source again. With dry_run=True nothing is written: the records are only
+    validated and counted. Returns a summary of the run, or None if there was nothing to migrate.
     """
-    json_path = "storage/scm_system.json"
-    db_path = "storage/scm_system.db"
-
     print("--- SCM Data Migration Utility ---")
-    
+
     # 1. Check if the source file exists
     if not os.path.exists(json_path):
         print(f"Error: Source file '{json_path}' not found. Nothing to migrate.")
-        return
+        return None
+
+    if workers is None:
+        workers = min(4, os.cpu_count() or 1)
+    source = os.path.abspath(json_path)
+    source_stat = os.stat(json_path)
+    # A checkpoint is only reused if the source is exactly the file it was taken from
+    signature = f"{source_stat.st_size}:{source_stat.st_mtime_ns}"
 
+    sqlite_repo = None
+    records_done = migrated = failed = skipped = 0
+    progress = Progress(source_stat.st_size, progress_interval)
     try:
-        # 2. Initialize repositories
-        print(f"Reading data from {json_path}...")
-        json_repo = JSONRepository(json_path)
-        sqlite_repo = SQLiteRepository(db_path)
+        # 2. Open the target and look for a checkpoint of a previous run
+        conn = None
+        if not dry_run:
+            sqlite_repo = SQLiteRepository(db_path)
+            conn = sqlite_repo.connection()
+            with conn:
+                conn.execute(CREATE_CHECKPOINTS_QUERY)
+            checkpoint = conn.execute(SELECT_CHECKPOINT_QUERY, (source,)).fetchone()
+            if checkpoint is not None and resume and checkpoint[0] == signature:
+                skipped, migrated, failed = checkpoint[1:]
+                print(f"Resuming after {skipped} records from a previous run...")
+            elif checkpoint is not None:
+                print("Ignoring the previous checkpoint (restart requested or source changed).")
 
-        # 3. Get customers from the JSON
-        customers_to_migrate = json_repo.get_all()
-        total = len(customers_to_migrate)
+        # 3. Stream the records, skipping the ones a previous run already committed
+        print(f"Reading data from {json_path}{' (dry run)' if dry_run else ''}...")
+        records = iter_json_array(json_path, on_read=progress.on_read)
+        records_done = sum(1 for _ in islice(records, skipped))
+        progress.begin()
 
-        if total == 0:
-            print("The JSON file is empty. No records to migrate.")
-            return
+        def chunks() -> Iterator[Tuple[int, list]]:
+            for i, chunk in enumerate(chunked(records, chunk_size)):
+                yield skipped + i * chunk_size, chunk
 
-        print(f"Found {total} customers. Starting migration to SQLite...")
-        print("-" * 40)
+        def write(result: Tuple[int, int, list, list]) -> None:
+            """Single writer: commits a validated chunk and its checkpoint in one transaction."""
+            nonlocal records_done, migrated, failed
+            start, count, rows, failures = result
+            if conn is not None:
+                written = _write_chunk(sqlite_repo, rows, failures,
+                                       lambda ok, bad: (source, signature, start + count, migrated + ok, failed + bad))
+            else:
+                written = len(rows)
+            for record_number, customer_id, error in failures:
+                print(f"Failed to migrate {customer_id} (record {record_number}): {error}")
+                log_error(f"Migration error for ID {customer_id} (record {record_number}): {error}")
+            records_done = start + count
+            migrated += written
+            failed += len(failures)
+            progress.records += count
+            progress.maybe_report(records_done)
 
-        # 4. Migration process
-        migrated_count = 0
-        for customer in customers_to_migrate:
-            try:
-                sqlite_repo.save(customer)
-                print(f"Migrated: {customer.customer_id} - {customer.name}")
-                migrated_count += 1
-            except Exception as e:
-                print(f"Failed to migrate {customer.customer_id}: {e}")
-                log_error(f"Migration error for ID {customer.customer_id}: {e}")
+        # 4. Validate in parallel, write in order from this thread
+        for result in ordered_map(_prepare_chunk, chunks(), workers):
+            write(result)
+        if conn is not None:
+            # Every record is committed: a later run must not resume after them
+            with conn:
+                conn.execute(DELETE_CHECKPOINT_QUERY, (source,))
 
         # 5. Final summary
+        seconds = progress.elapsed()
         print("-" * 40)
-        summary = f"Migration finished. Successfully moved {migrated_count}/{total} customers."
+        if records_done == 0:
+            print("The JSON file is empty. No records to migrate.")
+            return None
+        if dry_run:
+            summary = (f"Dry run finished. {migrated}/{records_done} customers would be migrated, "
+                       f"{failed} rejected ({seconds:.1f}s, {progress.rate():,.0f} records/s).")
+        else:
+            summary = (f"Migration finished. Successfully moved {migrated}/{records_done} customers "
+                       f"({seconds:.1f}s, {progress.rate():,.0f} records/s).")
         print(summary)
         log_info(summary)
+        return {
+            "total": records_done,
+            "migrated": migrated,
+            "failed": failed,
+            "resumed_after": skipped,
+            "seconds": seconds,
+            "records_per_s": progress.rate(),
+            "dry_run": dry_run
+        }
 
+    except KeyboardInterrupt:
+        message = f"Migration interrupted after {records_done} records."
+        if not dry_run:
+            message += " Run it again to resume from the last checkpoint."
+        print(message)
+        log_error(message)
+        raise
     except Exception as e:
-        error_msg = f"Critical migration failure: {e}"
+        error_msg = f"Critical migration failure after {records_done} records: {e}"
         print(f"{error_msg}")
         log_error(error_msg)
+        return None
+    finally:
+        if sqlite_repo is not None:
+            sqlite_repo.close()
+
+
+def _write_chunk(repository: SQLiteRepository, rows: List[tuple], failures: list, checkpoint) -> int:
+    """
+    Upserts the rows of a chunk and saves the checkpoint returned by `checkpoint(written, rejected)`
+    in the same transaction. If the batch fails, the rows are retried one by one and the ones
+    SQLite rejects are added to `failures`. Returns the number of rows written.
+    """
+    conn = repository.connection()
+    try:
+        with conn:
+            repository.upsert_rows(rows)
+            conn.execute(SAVE_CHECKPOINT_QUERY, checkpoint(len(rows), len(failures)))
+        return len(rows)
+    except sqlite3.Error:
+        pass
+
+    written = 0
+    for fields in rows:
+        try:
+            with conn:
+                repository.upsert_rows([fields])
+            written += 1
+        except sqlite3.Error as e:
+            failures.append((None, fields[0], str(e)))
+    with conn:
+        conn.execute(SAVE_CHECKPOINT_QUERY, checkpoint(written, len(failures)))
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Migrate the JSON customer store to SQLite.")
+    parser.add_argument('--source', default="storage/scm_system.json", help="JSON file to read")
+    parser.add_argument('--target', default="storage/scm_system.db", help="SQLite database to write")
+    parser.add_argument('--workers', type=int, default=None, help="validation processes (1 = no pool)")
+    parser.add_argument('--chunk-size', type=int, default=2000, help="records per transaction")
+    parser.add_argument('--dry-run', action='store_true', help="only validate and count the records")
+    parser.add_argument('--restart', action='store_true', help="ignore any checkpoint and start over")
+    parser.add_argument('--progress-interval', type=float, default=5.0, help="seconds between progress lines")
+    args = parser.parse_args(argv)
+    run_migration(args.source, args.target, workers=args.workers, chunk_size=args.chunk_size,
+                  dry_run=args.dry_run, resume=not args.restart, progress_interval=args.progress_interval)
+
 
 if __name__ == "__main__":
-    run_migration()
\ No newline at end of file
+    main()
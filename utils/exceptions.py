@@ -26,4 +26,19 @@ class CustomerNotFoundError(SCMError):
     """Raised when a requested customer does not exist in the system."""
     def __init__(self, customer_id):
         self.customer_id = customer_id
-        super().__init__(f"Customer with ID '{customer_id}' was not found.")
\ No newline at end of file
+        super().__init__(f"Customer with ID '{customer_id}' was not found.")
+
+class DuplicateCustomerError(SCMError):
+    """Raised when a customer looks like a duplicate of customers already stored under other IDs."""
+    def __init__(self, customer_id, matches):
+        self.customer_id = customer_id
+        # other customer ID -> fields that matched
+        self.matches = matches
+        details = ", ".join(f"{other_id} ({'/'.join(fields)})" for other_id, fields in matches.items())
+        super().__init__(f"Customer '{customer_id}' looks like a duplicate of: {details}")
+
+class CorruptStorageError(SCMError):
+    """Raised when a storage file exists but can't be parsed, instead of treating it as empty."""
+    def __init__(self, path, reason):
+        self.path = path
+        super().__init__(f"Storage file '{path}' is corrupt ({reason}). Restore it from a backup; it was not modified.")
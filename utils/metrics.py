@@ -0,0 +1,239 @@
+import bisect
+import functools
+import inspect
+import os
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Histogram upper bounds in seconds (Prometheus style, +Inf is implicit)
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+
+class _OperationStats:
+    """Counters and latency histogram of one (operation, component) pair."""
+    __slots__ = ('count', 'errors', 'total_seconds', 'bucket_counts')
+
+    def __init__(self, bucket_count: int):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        # One slot per bucket plus the +Inf overflow slot
+        self.bucket_counts = [0] * (bucket_count + 1)
+
+
+class MetricsRegistry:
+    """
+    In-process registry of operation counts, error counts and latency histograms.
+    Operations are labelled with the component that ran them (e.g. 'SQLiteRepository').
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.enabled = True
+        self._stats: Dict[Tuple[str, str], _OperationStats] = {}
+        self._lock = threading.Lock()
+        self._sinks: List["MetricsSink"] = []
+
+    def observe(self, operation: str, seconds: float, component: str = '', error: bool = False,
+                count: int = 1) -> None:
+        """
+        Records `count` executions of an operation that took `seconds` in total.
+        Batches (count > 1) are placed in the histogram by their average duration, which
+        keeps per-row operations like rehydration cheap to record.
+        """
+        if not self.enabled or count <= 0:
+            return
+        bucket = bisect.bisect_left(self.buckets, seconds / count)
+        key = (operation, component)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _OperationStats(len(self.buckets))
+            stats.count += count
+            stats.total_seconds += seconds
+            stats.bucket_counts[bucket] += count
+            if error:
+                stats.errors += 1
+
+    def timer(self, operation: str, component: str = '', count: int = 1) -> "_Timer":
+        """Context manager that records the duration of its block (as an error if it raises)."""
+        return _Timer(self, operation, component, count)
+
+    def snapshot(self) -> List[dict]:
+        """Returns a copy of every recorded operation, with cumulative histogram buckets."""
+        with self._lock:
+            items = [(key, stats.count, stats.errors, stats.total_seconds, list(stats.bucket_counts))
+                     for key, stats in self._stats.items()]
+
+        snapshot = []
+        for (operation, component), count, errors, total_seconds, bucket_counts in sorted(items):
+            cumulative, buckets = 0, []
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += bucket_count
+                buckets.append((bound, cumulative))
+            snapshot.append({
+                "operation": operation,
+                "component": component,
+                "count": count,
+                "errors": errors,
+                "sum_seconds": total_seconds,
+                "buckets": buckets
+            })
+        return snapshot
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    # --- Sinks ---
+    def add_sink(self, sink: "MetricsSink") -> None:
+        self._sinks.append(sink)
+
+    def remove_sink(self, sink: "MetricsSink") -> None:
+        self._sinks.remove(sink)
+
+    def export(self) -> None:
+        """Sends the current snapshot to every registered sink."""
+        snapshot = self.snapshot()
+        for sink in self._sinks:
+            sink.emit(snapshot)
+
+
+class _Timer:
+    __slots__ = ('registry', 'operation', 'component', 'count', 'start')
+
+    def __init__(self, registry: MetricsRegistry, operation: str, component: str, count: int):
+        self.registry = registry
+        self.operation = operation
+        self.component = component
+        self.count = count
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.registry.observe(self.operation, time.perf_counter() - self.start, self.component,
+                              error=exc_type is not None, count=self.count)
+
+
+class MetricsSink(ABC):
+    """Destination for registry snapshots, fed by MetricsRegistry.export()."""
+
+    @abstractmethod
+    def emit(self, snapshot: List[dict]) -> None:
+        pass
+
+
+class InMemorySink(MetricsSink):
+    """Keeps the latest snapshot in memory, e.g. for a status endpoint or tests."""
+
+    def __init__(self):
+        self.last_snapshot: List[dict] = []
+
+    def emit(self, snapshot: List[dict]) -> None:
+        self.last_snapshot = snapshot
+
+
+class PrometheusFileSink(MetricsSink):
+    """Writes the snapshot to a file in the Prometheus text exposition format."""
+
+    def __init__(self, file_path: str, prefix: str = 'scm'):
+        self.file_path = file_path
+        self.prefix = prefix
+
+    def emit(self, snapshot: List[dict]) -> None:
+        content = to_prometheus_text(snapshot, self.prefix)
+        # Replace the file atomically so a scraper never reads a partial dump
+        directory = os.path.dirname(os.path.abspath(self.file_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, self.file_path)
+
+
+def to_prometheus_text(snapshot: List[dict], prefix: str = 'scm') -> str:
+    """Renders a snapshot as Prometheus text: a latency histogram and an error counter per operation."""
+    histogram, errors = f'{prefix}_operation_seconds', f'{prefix}_operation_errors_total'
+    lines = [
+        f'# HELP {histogram} Duration of SCM operations in seconds.',
+        f'# TYPE {histogram} histogram',
+    ]
+    for entry in snapshot:
+        labels = f'operation="{entry["operation"]}",component="{entry["component"]}"'
+        for bound, cumulative in entry["buckets"]:
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{histogram}_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f'{histogram}_sum{{{labels}}} {entry["sum_seconds"]}')
+        lines.append(f'{histogram}_count{{{labels}}} {entry["count"]}')
+
+    lines.append(f'# HELP {errors} Number of SCM operations that raised an error.')
+    lines.append(f'# TYPE {errors} counter')
+    for entry in snapshot:
+        labels = f'operation="{entry["operation"]}",component="{entry["component"]}"'
+        lines.append(f'{errors}{{{labels}}} {entry["errors"]}')
+    return '\n'.join(lines) + '\n'
+
+
+# Default registry used by the repositories and validators
+metrics = MetricsRegistry()
+
+
+def instrumented(operation: str, component: Optional[str] = None) -> Callable:
+    """
+    Decorator that records every call of a function in the default registry.
+    For methods the component defaults to the class name of the instance. Generator
+    functions are timed only while they produce items, not while the caller consumes them.
+    """
+    def decorator(func: Callable) -> Callable:
+        def resolve_component(args) -> str:
+            if component is not None:
+                return component
+            return type(args[0]).__name__ if args else ''
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                if not metrics.enabled:
+                    yield from func(*args, **kwargs)
+                    return
+                generator = func(*args, **kwargs)
+                elapsed, error = 0.0, False
+                try:
+                    while True:
+                        start = time.perf_counter()
+                        try:
+                            item = next(generator)
+                        except StopIteration:
+                            elapsed += time.perf_counter() - start
+                            return
+                        elapsed += time.perf_counter() - start
+                        yield item
+                except GeneratorExit:
+                    raise
+                except BaseException:
+                    error = True
+                    raise
+                finally:
+                    generator.close()
+                    metrics.observe(operation, elapsed, resolve_component(args), error=error)
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                metrics.observe(operation, time.perf_counter() - start, resolve_component(args), error=True)
+                raise
+            metrics.observe(operation, time.perf_counter() - start, resolve_component(args))
+            return result
+        return wrapper
+    return decorator
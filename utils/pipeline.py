@@ -0,0 +1,83 @@
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, Optional
+from utils.metrics import metrics
+
+
+def _init_worker() -> None:
+    """Worker processes can't report their metrics to the parent, so don't pay for recording them."""
+    metrics.enabled = False
+
+
+def ordered_map(func: Callable, tasks: Iterable[tuple], workers: int) -> Iterator[Any]:
+    """
+    Yields func(*task) for every task, in task order.
+    With workers > 1 the calls run in a process pool (`func` must be a module-level function)
+    and at most two tasks per worker are in flight, so a large input is never read ahead in
+    full. With workers <= 1 the calls run inline.
+    """
+    if workers <= 1:
+        for task in tasks:
+            yield func(*task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        pending = deque()
+        try:
+            for task in tasks:
+                pending.append(executor.submit(func, *task))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # Stopped early (error or consumer gone): don't start the queued tasks
+            for future in pending:
+                future.cancel()
+
+
+class Progress:
+    """Throughput and ETA of a long-running job, estimated from the share of its input file read."""
+
+    def __init__(self, total_size: int, interval: float):
+        self.total_size = total_size
+        self.interval = interval
+        self.size_read = 0
+        self.records = 0
+        self.begin()
+
+    def on_read(self, size: int) -> None:
+        self.size_read += size
+
+    def begin(self) -> None:
+        """Starts measuring from here (e.g. after the records skipped on resume)."""
+        self.start = self.last_report = time.monotonic()
+        self.start_size = self.size_read
+        self.records = 0
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+    def rate(self) -> float:
+        elapsed = self.elapsed()
+        return self.records / elapsed if elapsed > 0 else 0.0
+
+    def eta(self) -> Optional[float]:
+        remaining = self.total_size - self.start_size
+        done = self.size_read - self.start_size
+        if remaining <= 0 or done <= 0:
+            return None
+        fraction = min(done / remaining, 1.0)
+        return self.elapsed() * (1 - fraction) / fraction
+
+    def maybe_report(self, records_done: int) -> None:
+        """Prints a progress line if `interval` seconds passed since the last one."""
+        now = time.monotonic()
+        if now - self.last_report < self.interval:
+            return
+        self.last_report = now
+        eta = self.eta()
+        percent = 100 * self.size_read / self.total_size if self.total_size else 100.0
+        eta_text = f"{eta:.0f}s" if eta is not None else "unknown"
+        print(f"  {records_done} records | {self.rate():,.0f} records/s | {percent:.1f}% read | ETA {eta_text}")